@@ -1,11 +1,74 @@
-import hmac, hashlib, base64, io, os, time
-from typing import Optional
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
-import requests
+import asyncio, contextvars, csv, functools, glob, hmac, hashlib, base64, io, logging, multiprocessing, os, tempfile, threading, time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import asdict, dataclass
+from typing import Iterable, Iterator, List, Optional
+from urllib.parse import quote, urlencode
+from fastapi import FastAPI, File, Header, HTTPException, Query, Request, UploadFile
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
+import httpx
+import orjson
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
 from openpyxl import load_workbook
 
-app = FastAPI(title="QR Backend (sin pandas)", version="1.0.0")
+import qr_render
+import xlsx_stream
+
+log = logging.getLogger("uvicorn.error")
+
+# cada cuántos segundos se revalida el Excel en segundo plano
+REFRESH_INTERVAL = float(os.getenv("REFRESH_INTERVAL", "60"))
+DEFAULT_HEADER_ROW = 12
+# si la fila de encabezados indicada no los tiene, se buscan en las primeras N filas
+HEADER_SCAN_ROWS = int(os.getenv("HEADER_SCAN_ROWS", "30"))
+MAX_HEADER_ROW = 1000   # tope de header_row (cada valor distinto es un parseo)
+# sheet_name="*": todas las hojas con los encabezados requeridos, o solo las de INDEX_SHEETS
+ALL_SHEETS = "*"
+INDEX_SHEETS = [s.strip() for s in os.getenv("INDEX_SHEETS", "").split(",") if s.strip()]
+# lector XLSX por streaming (xlsx_stream); 0 = usar siempre openpyxl
+XLSX_FAST_READER = os.getenv("XLSX_FAST_READER", "1").strip() != "0"
+# copia local del último snapshot para arrancar sin esperar a OneDrive; "" = desactivada
+# en un directorio propio de la app (no en /tmp, donde cualquiera puede dejar un archivo)
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "qr-backend", "snapshot.json",
+)).strip()
+# cliente HTTP compartido hacia OneDrive/SharePoint (keep-alive)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "4"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+HTTP2 = os.getenv("HTTP2", "0").strip() == "1"   # requiere el paquete h2
+# descargas simultáneas al refrescar varias fuentes (ONEDRIVE_SOURCES)
+SOURCE_CONCURRENCY = max(1, int(os.getenv("SOURCE_CONCURRENCY", "4")))
+# hilos para parsear Excel fuera del event loop (CPU: con 1-2 alcanza)
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "1"))
+# máximo de (doc, t) por request en /driver/batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+# Cache-Control: private, max-age=N en las respuestas de /driver
+DRIVER_MAX_AGE = int(os.getenv("DRIVER_MAX_AGE", "30"))
+# (doc, token) ya verificados que se recuerdan (LRU); 0 = sin caché
+VERIFY_CACHE_SIZE = int(os.getenv("VERIFY_CACHE_SIZE", "10000"))
+# base pública para armar las URLs de los QR (ej. https://qr-backend.onrender.com)
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").strip().rstrip("/")
+# QRs renderizados que se recuerdan (LRU); 0 = sin caché
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", "10000"))
+# procesos para renderizar QRs en lote; 1 = sin pool (un hilo), 0 = uno por CPU
+QR_WORKERS = int(os.getenv("QR_WORKERS", "1")) or (os.cpu_count() or 1)
+QR_MAX_SIZE = 40   # píxeles por módulo
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_snapshot()
+    task = asyncio.create_task(_refresh_loop())
+    try:
+        yield
+    finally:
+        task.cancel()
+        await close_http_client()
+        close_qr_pool()
+
+app = FastAPI(title="QR Backend (sin pandas)", version="1.0.0", lifespan=lifespan)
 
 # ===== utilidades =====
 
@@ -25,59 +88,213 @@ def secure_eq(a: str, b: str) -> bool:
     except Exception:
         return False
 
+class Signer:
+    """
+    HMAC-SHA256 con la clave ya cargada: el estado con los pads interno y
+    externo se arma una vez y cada firma parte de un `.copy()`. Recuerda
+    (LRU) los (doc, token) ya verificados como válidos.
+    """
+
+    def __init__(self, secret_key: str, cache_size: int = VERIFY_CACHE_SIZE):
+        self._mac = hmac.new(secret_key.encode(), digestmod=hashlib.sha256)
+        self._cache_size = cache_size
+        self._verified: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sign(self, doc: str) -> str:
+        mac = self._mac.copy()
+        mac.update(doc.encode())
+        return base64.urlsafe_b64encode(mac.digest()).decode().rstrip("=")
+
+    def verify(self, doc: str, t: str) -> bool:
+        key = (doc, t)
+        with self._lock:
+            if key in self._verified:
+                self._verified.move_to_end(key)
+                return True
+        try:
+            # normalizar padding de base64 urlsafe
+            ok = secure_eq(t, self.sign(doc))
+        except Exception:
+            return False
+        # solo se guardan tokens válidos: un token inválido nunca sale de la caché
+        if ok and self._cache_size > 0:
+            with self._lock:
+                self._verified[key] = True
+                if len(self._verified) > self._cache_size:
+                    self._verified.popitem(last=False)
+        return ok
+
+@functools.lru_cache(maxsize=8)
+def _signer_for(secret_key: str) -> Signer:
+    return Signer(secret_key)
+
 def sign(doc: str, secret_key: str) -> str:
-    mac = hmac.new(secret_key.encode(), doc.encode(), hashlib.sha256).digest()
-    return base64.urlsafe_b64encode(mac).decode().rstrip("=")
+    return _signer_for(secret_key).sign(doc)
+
+class Keyring:
+    """
+    Claves activas para rotar sin reimprimir QRs. Los tokens nuevos llevan el
+    id de la clave como prefijo ("<kid>.<hmac>") y se verifican solo contra
+    esa clave; los tokens viejos sin prefijo se prueban contra todas.
+    La primera clave es la que firma.
+    """
+
+    def __init__(self, keys: list):
+        if not keys:
+            raise ValueError("keyring vacío")
+        self._signers = {kid: _signer_for(secret) for kid, secret in keys}
+        self.active_kid: Optional[str] = keys[0][0]
+        self._active = self._signers[self.active_kid]
+
+    @property
+    def kids(self) -> list:
+        return list(self._signers)
+
+    def sign(self, doc: str) -> str:
+        mac = self._active.sign(doc)
+        return f"{self.active_kid}.{mac}" if self.active_kid else mac
+
+    def verify(self, doc: str, t: str) -> bool:
+        # "." no es parte del alfabeto base64 urlsafe: si está, separa el kid
+        kid, sep, mac = t.partition(".")
+        if sep:
+            signer = self._signers.get(kid)
+            return signer is not None and signer.verify(doc, mac)
+        return any(signer.verify(doc, t) for signer in self._signers.values())
+
+def parse_keyring(secret_keys: str, secret_key: str = "") -> Optional[Keyring]:
+    """
+    SECRET_KEYS="k2:secreto2,k1:secreto1" (la primera firma). SECRET_KEY, si
+    está, se suma como clave sin id: firma solo si no hay SECRET_KEYS y
+    verifica los tokens sin prefijo.
+    """
+    keys = []
+    for entry in filter(None, (e.strip() for e in secret_keys.split(","))):
+        kid, sep, secret = entry.partition(":")
+        kid, secret = kid.strip(), secret.strip()
+        if not sep or not kid or not secret or "." in kid:
+            raise ValueError(f"entrada inválida en SECRET_KEYS: {kid or entry!r} (formato kid:secreto)")
+        if any(k == kid for k, _ in keys):
+            raise ValueError(f"kid repetido en SECRET_KEYS: {kid!r}")
+        keys.append((kid, secret))
+    if secret_key:
+        keys.append((None, secret_key))
+    return Keyring(keys) if keys else None
 
 def verify(doc: str, t: str, secret_key: str) -> bool:
-    try:
-        expected = sign(doc, secret_key)
-        # normalizar padding de base64 urlsafe
-        return secure_eq(t, expected)
-    except Exception:
+    return _signer_for(secret_key).verify(doc, t)
+
+class SingleFlight:
+    """
+    Coalesce llamadas concurrentes con la misma clave: solo se ejecuta una
+    corrutina `fn(*args)`, las demás la esperan y comparten su resultado
+    (o su excepción).
+    """
+
+    def __init__(self):
+        self._calls: dict = {}
+
+    async def do(self, key, fn, *args):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # shield: si un request se cancela (cliente cortó) la descarga sigue para los demás
+        return await asyncio.shield(task)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match: lista de ETags o "*"; comparación débil (se ignora W/)."""
+    if not if_none_match:
         return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (t.strip() for t in if_none_match.split(","))
+    return etag in (t[2:] if t.startswith("W/") else t for t in tags)
 
 def normalize(s: Optional[str]) -> str:
     if s is None:
         return ""
     return " ".join(str(s).strip().split()).upper()
 
-# ===== lectura Excel SIN pandas =====
+# ===== métricas (Prometheus, expuestas en /metrics) =====
 
-def read_driver_from_excel(
-    xls_bytes: bytes,
-    sheet_name: Optional[str],
-    header_row_1based: int,
-    dni_value: str,
-) -> dict:
+STAGE_SECONDS = Histogram(
+    "qr_stage_seconds", "Duración de cada etapa de /driver y del parseo del Excel", ["stage"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60),
+)
+DOWNLOADS = Counter("qr_workbook_downloads_total", "Descargas del Excel por resultado", ["result"])
+DOWNLOAD_BYTES = Counter("qr_workbook_download_bytes_total", "Bytes descargados del Excel")
+CACHE = Counter("qr_cache_total", "Aciertos/fallos de caché", ["cache", "result"])
+RESPONSES = Counter("qr_responses_total", "Respuestas por endpoint y status HTTP", ["endpoint", "status"])
+
+# tiempos por etapa del request en curso (para Server-Timing); None fuera de un request
+_REQUEST_TIMINGS: contextvars.ContextVar = contextvars.ContextVar("request_timings", default=None)
+
+@contextmanager
+def stage(name: str):
     """
-    Lee el Excel y devuelve el registro del conductor por DNI de la COLUMNA E,
-    y extrae: D (NOMBRES Y APELLIDOS), E (DNI / CE), AF (FECHA DE VIGENCIA ...),
-    AG (ESTATUS DE PROCESO DE HABILITACION) usando los encabezados.
+    Mide una etapa: download, load_workbook, headers, scan, render, merge,
+    verify, lookup, serialize, qr_render. La misma medición va al histograma y
+    al Server-Timing del request.
     """
-    wb = load_workbook(io.BytesIO(xls_bytes), data_only=True, read_only=True)
-    ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.labels(name).observe(dt)
+        timings = _REQUEST_TIMINGS.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + dt
+
+def start_request_timings() -> dict:
+    timings: dict = {}
+    _REQUEST_TIMINGS.set(timings)
+    return timings
+
+def server_timing(timings: dict) -> str:
+    return ", ".join(f"{name};dur={dt * 1000:.2f}" for name, dt in timings.items())
+
+def count_responses(endpoint: str):
+    """Cuenta las respuestas del endpoint por status (incluye 401/404/502)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            try:
+                resp = await fn(*args, **kwargs)
+            except HTTPException as e:
+                RESPONSES.labels(endpoint, str(e.status_code)).inc()
+                raise
+            RESPONSES.labels(endpoint, str(getattr(resp, "status_code", 200))).inc()
+            return resp
+        return wrapper
+    return deco
+
+# ===== lectura Excel SIN pandas =====
+
+# encabezados requeridos (se buscan por NOMBRE, tolerante a espacios)
+REQUIRED_HEADERS = (
+    "NOMBRES Y APELLIDOS",        # col D
+    "DNI / CE",                   # col E
+    "FECHA DE VIGENCIA DE HABILITACIÓN DE LICENCIA INTERNA",  # col AF
+    "ESTATUS DE PROCESO DE HABILITACION",                      # col AG
+)
 
-    H = header_row_1based
-    headers = {}
+# encabezado normalizado -> nombre canónico (match exacto tras normalizar)
+_REQUIRED_BY_TEXT = {normalize(k): k for k in REQUIRED_HEADERS}
+
+def _resolve_columns(header_values) -> dict:
+    """Devuelve {encabezado requerido -> columna 1-based}; 400 si falta alguno."""
     # construir mapa de encabezados (posición -> texto normalizado)
-    for col in range(1, ws.max_column + 1):
-        val = ws.cell(row=H, column=col).value
-        headers[col] = normalize(val)
-
-    # buscamos las columnas por NOMBRE de encabezado (tolerante a espacios)
-    need = {
-        "NOMBRES Y APELLIDOS": None,        # col D
-        "DNI / CE": None,                   # col E
-        "FECHA DE VIGENCIA DE HABILITACIÓN DE LICENCIA INTERNA": None,  # col AF
-        "ESTATUS DE PROCESO DE HABILITACION": None,                      # col AG
-    }
+    headers = {col: normalize(val) for col, val in enumerate(header_values, start=1)}
 
+    need = {k: None for k in REQUIRED_HEADERS}
     for col, text in headers.items():
-        for k in list(need.keys()):
-            # match exacto tras normalizar
-            if text == normalize(k):
-                need[k] = col
+        k = _REQUIRED_BY_TEXT.get(text)
+        if k is not None:
+            need[k] = col   # si se repite, gana la última columna (como antes)
 
     missing = [k for k, v in need.items() if v is None]
     if missing:
@@ -85,29 +302,1051 @@ def read_driver_from_excel(
             status_code=400,
             detail={"error": "Faltan columnas requeridas por encabezado", "missing": missing, "encabezados": list(headers.values())}
         )
+    return need
+
+# (sha256 del archivo, hoja, fila de encabezados) -> columnas. Se descartan
+# junto con los índices de esa versión (ver evict_stale_indexes).
+_LAYOUTS: dict = {}
+
+def resolve_layout(version: Optional[str], sheet_title: str, header_row_1based: int, header_values) -> dict:
+    """Columnas de los encabezados requeridos, cacheadas por versión, hoja y fila."""
+    if version is None:
+        return _resolve_columns(header_values)
+    key = (version, sheet_title, header_row_1based)
+    need = _LAYOUTS.get(key)
+    if need is not None:
+        CACHE.labels("layout", "hit").inc()
+        return need
+    CACHE.labels("layout", "miss").inc()
+    need = _LAYOUTS[key] = _resolve_columns(header_values)
+    return need
+
+# cuerpo de /driver ya serializado: _BODY_PREFIX + driver + _BODY_SUFFIX
+_BODY_PREFIX = b'{"ok":true,"driver":'
+_BODY_SUFFIX = b"}"
+
+def _body_etag(body: bytes) -> str:
+    # ETag fuerte = hash del cuerpo: igual bytes <=> igual ETag, aunque cambien otras filas
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+def _row_hash(fields: tuple) -> bytes:
+    # estable entre procesos (va al snapshot en disco), a diferencia de hash()
+    return hashlib.blake2b("\x1f".join(fields).encode(), digest_size=8).digest()
+
+def _record(dni: str, fields: tuple) -> dict:
+    name, fvig, stat = fields
+    return {
+        "NOMBRES_Y_APELLIDOS": name,
+        "DNI_CE": dni,
+        "FECHA_VIGENCIA_LICENCIA_INTERNA": fvig,
+        "ESTATUS_PROCESO_HABILITACION": stat,
+    }
+
+def _fields(rec: dict) -> tuple:
+    """Inversa de _record: (nombre, vigencia, estatus)."""
+    return rec["NOMBRES_Y_APELLIDOS"], rec["FECHA_VIGENCIA_LICENCIA_INTERNA"], rec["ESTATUS_PROCESO_HABILITACION"]
+
+def _render(rec: dict) -> bytes:
+    return _BODY_PREFIX + orjson.dumps(rec) + _BODY_SUFFIX
+
+class DriverIndex(dict):
+    """
+    {DNI normalizado -> registro} de una hoja, con el cuerpo JSON de /driver
+    ya serializado por DNI en `bodies` y su ETag en `etags` (los datos solo
+    cambian con el Excel). Los índices de una hoja guardan el hash de cada
+    fila en `row_hashes`; los combinados (varias hojas o varias fuentes) traen
+    `origin` (DNI -> parte) y `parts` (nombre -> índice).
+    """
 
-    col_name = need["NOMBRES Y APELLIDOS"]
-    col_dni  = need["DNI / CE"]
-    col_fvig = need["FECHA DE VIGENCIA DE HABILITACIÓN DE LICENCIA INTERNA"]
-    col_stat = need["ESTATUS DE PROCESO DE HABILITACION"]
+    def __init__(self, records: dict, header_row: int = DEFAULT_HEADER_ROW, bodies: dict = None, etags: dict = None):
+        super().__init__(records)
+        self.header_row = header_row   # fila de encabezados efectiva (1-based)
+        self.row_hashes: Optional[dict] = None
+        self.kind: Optional[str] = None     # partes combinadas: "sheet" | "source"
+        self.origin: Optional[dict] = None
+        self.parts: dict = {}
+        self.first_sheet: Optional[str] = None   # hoja que responde a sheet_name vacío
+        self.first: Optional["DriverIndex"] = None   # su índice (aunque no esté en `parts`)
+        if bodies is not None:
+            self.bodies, self.etags = bodies, etags
+            return
+        with stage("render"):
+            self.bodies = {dni: _render(rec) for dni, rec in records.items()}
+            self.etags = {dni: _body_etag(body) for dni, body in self.bodies.items()}
 
-    dni_value_norm = normalize(dni_value)
+    @classmethod
+    def from_rows(cls, rows: dict, header_row: int, base: "DriverIndex" = None, title: str = "") -> "DriverIndex":
+        """
+        Índice de una hoja desde {DNI -> (nombre, vigencia, estatus)}. Con `base`
+        (la misma hoja en la versión anterior del Excel) se parte de una copia y
+        solo se arman y serializan las filas agregadas o cambiadas; si no cambió
+        ninguna se devuelve `base` tal cual.
+        """
+        hashes = {dni: _row_hash(fields) for dni, fields in rows.items()}
+        if base is None or base.row_hashes is None:
+            index = cls({dni: _record(dni, fields) for dni, fields in rows.items()}, header_row)
+            index.row_hashes = hashes
+            return index
 
+        old = base.row_hashes
+        removed = old.keys() - hashes.keys()
+        dirty = [dni for dni, h in hashes.items() if old.get(dni) != h]
+        CACHE.labels("row", "hit").inc(len(hashes) - len(dirty))
+        CACHE.labels("row", "miss").inc(len(dirty))
+        if not removed and not dirty and base.header_row == header_row:
+            return base
+        log.info("Índice de %r: %d filas nuevas o cambiadas, %d quitadas, %d sin cambios",
+                 title, len(dirty), len(removed), len(hashes) - len(dirty))
+        with stage("render"):
+            records, bodies, etags = dict(base), dict(base.bodies), dict(base.etags)
+            for dni in removed:
+                del records[dni], bodies[dni], etags[dni]
+            for dni in dirty:
+                records[dni] = rec = _record(dni, rows[dni])
+                bodies[dni] = body = _render(rec)
+                etags[dni] = _body_etag(body)
+        index = cls(records, header_row, bodies, etags)
+        index.row_hashes = hashes
+        return index
+
+    @classmethod
+    def merge(cls, parts: dict, header_row: int, kind: str = "sheet", prev: "DriverIndex" = None) -> "DriverIndex":
+        """
+        Combina {nombre -> índice} sin volver a serializar. Si un DNI está en
+        varias partes gana la primera (orden de `parts`). Con `prev` (merge
+        anterior de las mismas partes) se parte de una copia y solo se
+        recalculan los DNIs de las partes que cambiaron.
+        """
+        if prev is not None and list(prev.parts) == list(parts):
+            changed = [name for name, part in parts.items() if part is not prev.parts[name]]
+            if not changed:
+                return prev
+            records, bodies, etags, origin = dict(prev), dict(prev.bodies), dict(prev.etags), dict(prev.origin)
+            dirty = set()
+            for name in changed:
+                dirty.update(prev.parts[name].keys(), parts[name].keys())
+            for dni in dirty:
+                for name, part in parts.items():
+                    if dni in part:
+                        records[dni], bodies[dni], etags[dni], origin[dni] = part[dni], part.bodies[dni], part.etags[dni], name
+                        break
+                else:
+                    del records[dni], bodies[dni], etags[dni], origin[dni]
+        elif parts:
+            # la primera parte entra entera (copias de dict, sin recorrer DNI por DNI)
+            (first, head), *rest = parts.items()
+            records, bodies, etags, origin = dict(head), dict(head.bodies), dict(head.etags), dict.fromkeys(head, first)
+            for name, part in rest:
+                for dni, rec in part.items():
+                    if dni not in records:
+                        records[dni] = rec
+                        bodies[dni] = part.bodies[dni]
+                        etags[dni] = part.etags[dni]
+                        origin[dni] = name
+        else:
+            records, bodies, etags, origin = {}, {}, {}, {}
+        merged = cls(records, header_row, bodies, etags)
+        merged.kind = kind
+        merged.origin = origin
+        merged.parts = dict(parts)
+        return merged
+
+    def where(self, dni: str) -> dict:
+        """De dónde sale un DNI de un índice combinado: {"source": ..., "sheet": ...}."""
+        out, index = {}, self
+        while index.origin is not None:
+            name = index.origin[dni]
+            out[index.kind] = name
+            index = index.parts[name]
+        return out
+
+    def driver_json(self, dni: str) -> bytes:
+        """Solo el objeto "driver" serializado (para armar respuestas compuestas)."""
+        return self.bodies[dni][len(_BODY_PREFIX):-len(_BODY_SUFFIX)]
+
+def build_driver_index(
+    xls_bytes: bytes,
+    sheet_name: Optional[str],
+    header_row_1based: int,
+    base: Optional[DriverIndex] = None,
+    same_version: bool = False,
+    version: Optional[str] = None,
+) -> DriverIndex:
+    """
+    Lee el Excel UNA vez y arma el índice {DNI normalizado -> registro} con:
+    D (NOMBRES Y APELLIDOS), E (DNI / CE), AF (FECHA DE VIGENCIA ...),
+    AG (ESTATUS DE PROCESO DE HABILITACION). Si un DNI se repite gana la
+    primera fila, igual que el recorrido secuencial de antes.
+    `header_row_1based` es una pista: ver _find_header_row. `base` es el
+    índice de la versión anterior (ver DriverIndex.from_rows) o, con
+    `same_version`, el de esta misma versión con otra pista: si los
+    encabezados caen en la misma fila se devuelve sin recorrer la hoja.
+    Con `version` (sha256 del archivo) las columnas quedan en _LAYOUTS.
+    """
+    if XLSX_FAST_READER:
+        try:
+            with stage("load_workbook"):
+                wb = xlsx_stream.XlsxReader(xls_bytes)
+            try:
+                return _index_workbook(wb, sheet_name, header_row_1based, base, same_version, version)
+            finally:
+                wb.close()
+        except xlsx_stream.UnsupportedWorkbook as e:
+            log.info("Lector rápido no soporta este Excel (%s); uso openpyxl", e)
+
+    with stage("load_workbook"):
+        wb = load_workbook(io.BytesIO(xls_bytes), data_only=True, read_only=True)
+    try:
+        return _index_workbook(wb, sheet_name, header_row_1based, base, same_version, version)
+    finally:
+        wb.close()
+
+def _index_workbook(
+    wb, sheet_name: Optional[str], H: int, base: Optional[DriverIndex] = None, same_version: bool = False,
+    version: Optional[str] = None,
+) -> DriverIndex:
+    by_title = {ws.title: ws for ws in wb.worksheets}
+    if version is not None:
+        _SHEET_TITLES[version] = list(by_title)
+    if sheet_name != ALL_SHEETS:
+        if sheet_name and sheet_name not in by_title:
+            raise _unknown_sheet(sheet_name, list(by_title))
+        return _index_worksheet(by_title[sheet_name] if sheet_name else wb.worksheets[0], H, base, same_version, version)
+
+    # todas las hojas (o las de INDEX_SHEETS, en ese orden) con el workbook abierto una sola vez
+    names = [n for n in INDEX_SHEETS if n in by_title] if INDEX_SHEETS else list(by_title)
+    base_parts = base.parts if base is not None and base.kind == "sheet" else {}
+    parts, skipped = {}, []
+    for name in names:
+        try:
+            parts[name] = _index_worksheet(by_title[name], H, base_parts.get(name), same_version, version)
+        except HTTPException:
+            skipped.append(name)   # hoja sin la tabla de conductores
+    if not parts:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "Ninguna hoja tiene los encabezados requeridos", "hojas": names},
+        )
+    if skipped:
+        log.info("Hojas sin los encabezados requeridos (se ignoran): %s", skipped)
+    # sheet_name vacío = primera hoja, esté o no en INDEX_SHEETS (con el mismo workbook abierto)
+    first = wb.worksheets[0].title
+    first_index = parts.get(first)
+    if first_index is None and first not in names:
+        base_first = base.first if base is not None and base.first_sheet == first else None
+        try:
+            first_index = _index_worksheet(by_title[first], H, base_first, same_version, version)
+        except HTTPException:
+            pass
+    if first_index is None:
+        first = None
+    same_first = base is not None and base.first_sheet == first and base.first is first_index
+    merged = DriverIndex.merge(parts, H, prev=base if base_parts and same_first else None)
+    merged.first_sheet, merged.first = first, first_index
+    return merged
+
+def _index_worksheet(
+    ws, header_row_1based: int, base: Optional[DriverIndex] = None, same_version: bool = False,
+    version: Optional[str] = None,
+) -> DriverIndex:
+    # en read_only, ws.cell() re-lee el XML de la hoja en cada llamada:
+    # todo se lee con iter_rows en una sola pasada hacia adelante
+    with stage("headers"):
+        H, need = _find_header_row(ws, header_row_1based, version)
+    if same_version and base is not None and base.header_row == H:
+        return base   # mismo Excel y misma tabla: otra pista que cayó en la misma fila
+
+    # solo el rango de columnas que nos interesa (D..AG en el formato actual)
+    lo, hi = min(need.values()), max(need.values())
+    i_name = need["NOMBRES Y APELLIDOS"] - lo
+    i_dni  = need["DNI / CE"] - lo
+    i_fvig = need["FECHA DE VIGENCIA DE HABILITACIÓN DE LICENCIA INTERNA"] - lo
+    i_stat = need["ESTATUS DE PROCESO DE HABILITACION"] - lo
+
+    rows = {}
     # recorrer filas de datos
-    for row in range(H + 1, ws.max_row + 1):
-        cell_dni = normalize(ws.cell(row=row, column=col_dni).value)
-        if cell_dni == dni_value_norm:
-            nombres = ws.cell(row=row, column=col_name).value
-            fecha_vig = ws.cell(row=row, column=col_fvig).value
-            estatus = ws.cell(row=row, column=col_stat).value
-            return {
-                "NOMBRES_Y_APELLIDOS": str(nombres or "").strip(),
-                "DNI_CE": dni_value_norm,
-                "FECHA_VIGENCIA_LICENCIA_INTERNA": str(fecha_vig or "").strip(),
-                "ESTATUS_PROCESO_HABILITACION": str(estatus or "").strip(),
+    with stage("scan"):
+        for row in ws.iter_rows(min_row=H + 1, min_col=lo, max_col=hi, values_only=True):
+            dni = normalize(row[i_dni])
+            if not dni or dni in rows:
+                continue
+            rows[dni] = (
+                str(row[i_name] or "").strip(),
+                str(row[i_fvig] or "").strip(),
+                str(row[i_stat] or "").strip(),
+            )
+    return DriverIndex.from_rows(rows, H, base, ws.title)
+
+# sha256 del archivo -> títulos de sus hojas (las de celdas, sin chartsheets)
+_SHEET_TITLES: dict = {}
+
+def _unknown_sheet(sheet_name: str, titles: list) -> HTTPException:
+    return HTTPException(status_code=400, detail={"error": "No existe la hoja", "sheet_name": sheet_name, "hojas": titles})
+
+def check_sheet_name(version: str, sheet_name: Optional[str]):
+    """400 sin abrir el Excel si esa versión ya se leyó y no tiene la hoja pedida."""
+    titles = _SHEET_TITLES.get(version)
+    if titles is not None and sheet_name and sheet_name != ALL_SHEETS and sheet_name not in titles:
+        raise _unknown_sheet(sheet_name, titles)
+
+# (hoja, fila pedida) -> última fila de encabezados detectada; se prueba primero
+# en la próxima versión del Excel
+_HEADER_ROWS: dict = {}
+
+def _has_required_headers(values) -> bool:
+    texts = {normalize(v) for v in values if v is not None}
+    return all(k in texts for k in _REQUIRED_BY_TEXT)
+
+def _find_header_row(ws, hint: int, version: Optional[str] = None):
+    """
+    (fila, columnas). Se prueba la fila pedida, luego la detectada en la versión
+    anterior y si no, la primera de las HEADER_SCAN_ROWS filas que tenga todos
+    los encabezados requeridos. Solo se leen esas filas del principio de la
+    hoja, más la pedida y la anterior si están más abajo. Si no aparece, el 400
+    es el de la fila pedida.
+    """
+    hint = min(max(hint, 1), MAX_HEADER_ROW)
+    prev = _HEADER_ROWS.get((ws.title, hint))
+    rows = dict(enumerate(ws.iter_rows(min_row=1, max_row=HEADER_SCAN_ROWS, values_only=True), start=1))
+    for r in {hint, prev or hint} - rows.keys():
+        rows[r] = next(ws.iter_rows(min_row=r, max_row=r, values_only=True), ())
+
+    candidates = [hint]
+    if prev and prev != hint:
+        candidates.append(prev)
+    candidates += range(1, HEADER_SCAN_ROWS + 1)
+    for r in candidates:
+        if _has_required_headers(rows.get(r, ())):
+            if r != hint and _HEADER_ROWS.get((ws.title, hint)) != r:
+                log.warning("Encabezados de %r en la fila %d (se pidió %d)", ws.title, r, hint)
+            _HEADER_ROWS[(ws.title, hint)] = r
+            return r, resolve_layout(version, ws.title, r, rows[r])
+    # ninguna fila sirve: _resolve_columns lanza el 400 con lo que hay en la fila pedida
+    return hint, _resolve_columns(rows[hint])
+
+# ===== índice residente por versión del workbook =====
+
+# (sha256 del archivo, hoja, fila de encabezados) -> índice por DNI.
+# Al publicar un snapshot se descartan los de versiones que ya no están en
+# ninguna fuente (ver evict_stale_indexes).
+_INDEX_CACHE: dict = {}
+_INDEX_LOCK = threading.Lock()
+_INDEX_MAX_ENTRIES = 256
+# misma clave -> el 400 de un Excel sin los encabezados: no se vuelve a parsear
+# en cada request mientras sea la misma versión
+_INDEX_ERRORS: dict = {}
+
+def evict_stale_indexes():
+    # corre en el event loop y sin _INDEX_LOCK (un parseo lo tiene por segundos):
+    # acá y en el hilo de parseo se recorren siempre copias (list(...)) de los dicts
+    live = _live_versions()
+    for k in [k for k in list(_INDEX_CACHE) if k[0] not in live]:
+        _INDEX_CACHE.pop(k, None)
+    for k in [k for k in list(_LAYOUTS) if k[0] not in live]:
+        _LAYOUTS.pop(k, None)
+    for k in [k for k in list(_INDEX_ERRORS) if k[0] not in live]:
+        _INDEX_ERRORS.pop(k, None)
+    for k in [k for k in list(_SHEET_TITLES) if k not in live]:
+        _SHEET_TITLES.pop(k, None)
+
+def _cached_error(key):
+    """El 400 ya visto para esta clave, como excepción nueva (o None)."""
+    e = _INDEX_ERRORS.get(key)
+    return HTTPException(status_code=e.status_code, detail=e.detail) if e is not None else None
+
+def _evict_for_insert():
+    """
+    Lugar para una entrada más: se sacan las más viejas de versiones que ya no
+    se sirven. Las del snapshot vigente no se tocan (si no, cualquiera con un
+    token podría sacarlas pidiendo muchas header_row distintas); son pocas
+    porque header_row está acotado y las pistas equivocadas comparten objeto.
+    """
+    excess = len(_INDEX_CACHE) - _INDEX_MAX_ENTRIES + 1
+    if excess <= 0:
+        return
+    live = _live_versions()
+    for k in [k for k in list(_INDEX_CACHE) if k[0] not in live][:excess]:
+        _INDEX_CACHE.pop(k, None)
+
+def get_driver_index(
+    xls_bytes: bytes,
+    sheet_name: Optional[str],
+    header_row_1based: int,
+    version: Optional[str] = None,
+    base_version: Optional[str] = None,
+) -> DriverIndex:
+    """
+    Índice del workbook; se reconstruye solo si cambió el contenido del archivo.
+    Con `base_version` (versión anterior del mismo Excel) y su índice todavía en
+    caché, solo se procesan las filas que cambiaron. Otra pista de header_row
+    sobre una versión ya indexada parte del índice de esa hoja: si cae en la
+    misma tabla se reutiliza ese objeto sin recorrer la hoja ni duplicarlo.
+    """
+    if version is None:
+        version = hashlib.sha256(xls_bytes).hexdigest()
+    key = (version, sheet_name, header_row_1based)
+    index = _INDEX_CACHE.get(key)
+    if index is not None:
+        return index
+    check_sheet_name(version, sheet_name)
+    with _INDEX_LOCK:
+        # otro hilo pudo haberlo construido (o fallado) mientras esperábamos
+        index = _INDEX_CACHE.get(key)
+        error = _cached_error(key)
+        if error is not None:
+            raise error
+        if index is None:
+            base = _INDEX_CACHE.get((base_version, sheet_name, header_row_1based)) if base_version else None
+            same = next((i for (v, name, _), i in list(_INDEX_CACHE.items()) if v == version and name == sheet_name), None)
+            try:
+                if same is not None:
+                    index = build_driver_index(xls_bytes, sheet_name, header_row_1based, same, same_version=True, version=version)
+                else:
+                    index = build_driver_index(xls_bytes, sheet_name, header_row_1based, base, version=version)
+            except HTTPException as e:
+                for k in list(_INDEX_ERRORS)[:len(_INDEX_ERRORS) - _INDEX_MAX_ENTRIES + 1]:
+                    _INDEX_ERRORS.pop(k, None)
+                _INDEX_ERRORS[key] = e
+                raise
+            _evict_for_insert()
+            _INDEX_CACHE[key] = index
+            # la fila real también sirve como clave (otros clientes pueden pedirla directo)
+            _INDEX_CACHE.setdefault((version, sheet_name, index.header_row), index)
+            # con "*" quedan armadas también las hojas sueltas
+            parts = dict(index.parts)
+            if index.first is not None:
+                parts[None] = index.first
+            for name, part in parts.items():
+                _INDEX_CACHE.setdefault((version, name, header_row_1based), part)
+                _INDEX_CACHE.setdefault((version, name, part.header_row), part)
+    return index
+
+# parseo (CPU) fuera del event loop, con concurrencia acotada
+_PARSE_EXECUTOR = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="xlsx-parse")
+
+async def run_parse(fn, *args):
+    # copy_context: que las etapas medidas en el hilo lleguen al Server-Timing del request
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_PARSE_EXECUTOR, ctx.run, fn, *args)
+
+async def get_driver_index_async(
+    xls_bytes: bytes,
+    sheet_name: Optional[str],
+    header_row_1based: int,
+    version: str,
+    base_version: Optional[str] = None,
+) -> DriverIndex:
+    """Como get_driver_index, pero si hay que parsear lo hace en _PARSE_EXECUTOR."""
+    key = (version, sheet_name, header_row_1based)
+    index = _INDEX_CACHE.get(key)
+    error = _cached_error(key) if index is None else None
+    if error is not None:
+        CACHE.labels("index", "hit").inc()
+        raise error
+    if index is None:
+        # una hoja que no existe se rechaza sin pasar por el lock de parseo
+        check_sheet_name(version, sheet_name)
+        CACHE.labels("index", "miss").inc()
+        index = await run_parse(get_driver_index, xls_bytes, sheet_name, header_row_1based, version, base_version)
+    else:
+        CACHE.labels("index", "hit").inc()
+    return index
+
+# ===== descarga condicional del workbook =====
+
+@dataclass
+class WorkbookFile:
+    url: str
+    content: bytes
+    version: str                  # sha256 del contenido
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+# url de descarga -> última copia descargada (con sus validadores HTTP)
+_WORKBOOKS: dict = {}
+
+# un solo cliente async con pool de conexiones: el handshake TLS con
+# SharePoint se paga una vez y no en cada descarga
+_HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+
+def http_client() -> httpx.AsyncClient:
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None:
+        kwargs = dict(
+            follow_redirects=True,   # el link de descarga redirige al archivo real
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+        )
+        try:
+            _HTTP_CLIENT = httpx.AsyncClient(http2=HTTP2, **kwargs)
+        except ImportError:
+            log.warning("HTTP2=1 pero falta el paquete h2; uso HTTP/1.1")
+            _HTTP_CLIENT = httpx.AsyncClient(**kwargs)
+    return _HTTP_CLIENT
+
+async def close_http_client():
+    global _HTTP_CLIENT
+    client, _HTTP_CLIENT = _HTTP_CLIENT, None
+    if client is not None:
+        await client.aclose()
+
+# una sola descarga en vuelo por URL: las fuentes que comparten archivo la comparten
+_DOWNLOAD_FLIGHT = SingleFlight()
+
+async def fetch_workbook(url: str) -> WorkbookFile:
+    """
+    Descarga el Excel con GET condicional (If-None-Match / If-Modified-Since).
+    Si OneDrive responde 304 se reutiliza la copia anterior sin volver a parsear.
+    El cuerpo se lee en streaming, calculando el sha256 a medida que llega.
+    """
+    return await _DOWNLOAD_FLIGHT.do(url, _fetch_workbook, url)
+
+async def _fetch_workbook(url: str) -> WorkbookFile:
+    prev = _WORKBOOKS.get(url)
+    # no-cache: que ningún proxy intermedio conteste por su cuenta, siempre revalidar
+    headers = {"Cache-Control": "no-cache"}
+    if prev is not None:
+        if prev.etag:
+            headers["If-None-Match"] = prev.etag
+        if prev.last_modified:
+            headers["If-Modified-Since"] = prev.last_modified
+
+    try:
+        with stage("download"):
+            async with http_client().stream("GET", url, headers=headers) as r:
+                if r.status_code == 304 and prev is not None:
+                    DOWNLOADS.labels("not_modified").inc()
+                    CACHE.labels("workbook", "hit").inc()
+                    return prev
+                if r.status_code != 200:
+                    DOWNLOADS.labels(f"http_{r.status_code}").inc()
+                    raise HTTPException(status_code=502, detail=f"No pude descargar Excel ({r.status_code})")
+                body = bytearray()
+                digest = hashlib.sha256()
+                async for chunk in r.aiter_bytes():
+                    body += chunk
+                    digest.update(chunk)
+    except httpx.HTTPError as e:
+        DOWNLOADS.labels("error").inc()
+        raise HTTPException(status_code=502, detail=f"No pude descargar Excel ({e.__class__.__name__})")
+    DOWNLOADS.labels("ok").inc()
+    DOWNLOAD_BYTES.inc(len(body))
+    CACHE.labels("workbook", "miss").inc()
+
+    wbf = WorkbookFile(
+        url=url,
+        content=bytes(body),
+        version=digest.hexdigest(),
+        etag=r.headers.get("ETag"),
+        last_modified=r.headers.get("Last-Modified"),
+        fetched_at=time.time(),
+    )
+    _WORKBOOKS[url] = wbf
+    return wbf
+
+# ===== fuentes: uno o varios Excel =====
+
+@dataclass(frozen=True)
+class Source:
+    name: str
+    url: str                                  # link de "Compartir" de OneDrive/SharePoint
+    sheet_name: Optional[str] = ALL_SHEETS
+    header_row: int = DEFAULT_HEADER_ROW
+
+def onedrive_url() -> str:
+    return os.getenv("ONEDRIVE_URL", "").strip()
+
+def multi_source() -> bool:
+    """Con ONEDRIVE_SOURCES los lookups van contra el índice unificado de todas las fuentes."""
+    return bool(os.getenv("ONEDRIVE_SOURCES", "").strip())
+
+def has_sources() -> bool:
+    return multi_source() or bool(onedrive_url())
+
+@functools.lru_cache(maxsize=4)
+def parse_sources(raw: str) -> tuple:
+    """
+    ONEDRIVE_SOURCES='[{"name": "mina-a", "url": "...", "sheet_name": "*", "header_row": 12}, ...]'.
+    El orden es la precedencia: si un DNI está en varias fuentes gana la primera.
+    """
+    try:
+        items = orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
+        raise ValueError(f"ONEDRIVE_SOURCES no es JSON válido: {e}")
+    if not isinstance(items, list) or not items:
+        raise ValueError("ONEDRIVE_SOURCES debe ser una lista JSON no vacía")
+    sources = []
+    for i, item in enumerate(items, start=1):
+        if not isinstance(item, dict) or not str(item.get("url") or "").strip():
+            raise ValueError(f"ONEDRIVE_SOURCES: a la fuente {i} le falta url")
+        name = str(item.get("name") or f"fuente-{i}").strip()
+        if any(s.name == name for s in sources):
+            raise ValueError(f"ONEDRIVE_SOURCES: nombre repetido {name!r}")
+        header_row = int(item.get("header_row", DEFAULT_HEADER_ROW))
+        if not 1 <= header_row <= MAX_HEADER_ROW:
+            raise ValueError(f"ONEDRIVE_SOURCES: header_row de {name!r} fuera de 1..{MAX_HEADER_ROW}")
+        sources.append(Source(
+            name=name,
+            url=item["url"].strip(),
+            sheet_name=item.get("sheet_name", ALL_SHEETS),
+            header_row=header_row,
+        ))
+    return tuple(sources)
+
+def configured_sources() -> tuple:
+    """Fuentes de ONEDRIVE_SOURCES; sin ella, ONEDRIVE_URL como fuente única."""
+    if multi_source():
+        try:
+            return parse_sources(os.getenv("ONEDRIVE_SOURCES", "").strip())
+        except ValueError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    url = onedrive_url()
+    if not url:
+        raise HTTPException(status_code=500, detail="Falta variable de entorno: ONEDRIVE_URL")
+    return (Source("default", url),)
+
+# ===== snapshot servido + refresco en segundo plano =====
+
+@dataclass
+class Snapshot:
+    sources: tuple                # fuentes configuradas al armarlo (orden = precedencia)
+    workbooks: dict               # fuente -> WorkbookFile
+    validated: dict               # fuente -> última vez que OneDrive confirmó esa versión
+    index: Optional[DriverIndex] = None   # índice unificado (solo con ONEDRIVE_SOURCES)
+
+    @property
+    def workbook(self) -> WorkbookFile:
+        """El Excel de la fuente única (ONEDRIVE_URL)."""
+        return next(iter(self.workbooks.values()))
+
+    @property
+    def validated_at(self) -> float:
+        # con varias fuentes manda la más desactualizada
+        return min(self.validated.values())
+
+    def age(self) -> float:
+        return max(0.0, time.time() - self.validated_at)
+
+    def versions(self) -> dict:
+        return {name: wbf.version for name, wbf in self.workbooks.items()}
+
+# snapshot vigente; se reemplaza entero (asignación atómica), nunca se muta
+_SNAPSHOT: Optional[Snapshot] = None
+
+def _live_versions() -> set:
+    snap = _SNAPSHOT
+    return set(snap.versions().values()) if snap is not None else set()
+
+async def snapshot_index(snap: Snapshot, sheet_name: Optional[str], header_row_1based: int) -> DriverIndex:
+    """
+    Índice para un request: con varias fuentes, el unificado (cada fuente usa
+    su propia hoja y fila de encabezados); si no, el de la hoja/fila pedidas.
+    """
+    if snap.index is not None:
+        return snap.index
+    wbf = snap.workbook
+    return await get_driver_index_async(wbf.content, sheet_name, header_row_1based, wbf.version)
+
+async def driver_index_for(snap: Snapshot, sheet_name: Optional[str], header_row_1based: int, dni: str) -> DriverIndex:
+    """
+    snapshot_index para buscar `dni`. Sin hoja pedida y con fuente única se
+    parte del índice de todas las hojas que ya armó el refresco: la primera
+    hoja si tiene el DNI y si no el combinado (las URLs de los QR solo llevan
+    doc y t, y la primera hoja puede ser una portada). La primera hoja se
+    busca aunque no esté en INDEX_SHEETS.
+    """
+    if sheet_name is not None or snap.index is not None:
+        return await snapshot_index(snap, sheet_name, header_row_1based)
+    try:
+        index = await snapshot_index(snap, ALL_SHEETS, header_row_1based)
+    except HTTPException:
+        if not INDEX_SHEETS:
+            raise
+        # ninguna hoja de INDEX_SHEETS tiene la tabla: queda la primera hoja sola
+        return await snapshot_index(snap, None, header_row_1based)
+    first = index.first
+    return first if first is not None and dni in first else index
+
+# una sola revalidación en vuelo por configuración; los requests concurrentes la comparten
+_REFRESH_FLIGHT = SingleFlight()
+
+async def refresh_snapshot() -> Snapshot:
+    """Revalida el/los Excel, deja listos los índices y publica el snapshot."""
+    sources = configured_sources()
+    return await _REFRESH_FLIGHT.do(sources, _refresh_snapshot, sources)
+
+async def _refresh_source(src: Source, sem: asyncio.Semaphore, strict: bool, prev: Optional[Snapshot]):
+    """(WorkbookFile, índice) de una fuente; descargas acotadas por `sem`."""
+    async with sem:
+        wbf = await fetch_workbook(od_to_download(src.url))
+    # la versión publicada de esta fuente: base para rehacer solo las filas que cambiaron
+    base_version = prev.workbooks[src.name].version if prev is not None and src.name in prev.workbooks else None
+    try:
+        # parsear ANTES de publicar, para que los requests no paguen el parseo;
+        # "*" arma todas las hojas con conductores (y la primera, si es una de ellas)
+        index = await get_driver_index_async(wbf.content, src.sheet_name, src.header_row, wbf.version, base_version)
+    except HTTPException as e:
+        if strict:
+            raise
+        log.warning("Excel sin el formato esperado (fila %s): %s", src.header_row, e.detail)
+        index = None
+    return wbf, index
+
+def _merge_sources(parts: dict, prev: Optional[DriverIndex]) -> DriverIndex:
+    with stage("merge"):
+        return DriverIndex.merge(parts, DEFAULT_HEADER_ROW, kind="source", prev=prev)
+
+async def _refresh_snapshot(sources: tuple) -> Snapshot:
+    global _SNAPSHOT
+    prev = _SNAPSHOT if _SNAPSHOT is not None and _SNAPSHOT.sources == sources else None
+    multi = multi_source()
+    sem = asyncio.Semaphore(SOURCE_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_refresh_source(src, sem, strict=multi, prev=prev) for src in sources), return_exceptions=True,
+    )
+    now = time.time()
+    workbooks, validated, parts = {}, {}, {}
+    for src, res in zip(sources, results):
+        if not isinstance(res, BaseException):
+            workbooks[src.name], parts[src.name] = res
+            validated[src.name] = now
+            continue
+        if not multi or not isinstance(res, Exception):
+            raise res
+        # stale-while-revalidate por fuente: las demás se publican igual
+        if prev is None or src.name not in prev.workbooks:
+            log.warning("Fuente %r sin datos todavía: %r", src.name, res)
+            continue
+        log.warning("No pude refrescar la fuente %r, sigo con la versión anterior: %r", src.name, res)
+        workbooks[src.name] = prev.workbooks[src.name]
+        validated[src.name] = prev.validated[src.name]
+        parts[src.name] = prev.index.parts[src.name]
+    if not workbooks:
+        raise HTTPException(status_code=502, detail="No pude descargar ningún Excel")
+
+    index = None
+    if multi:
+        # sin `prev` que sirva copia todos los DNIs de todas las fuentes: fuera del event loop
+        index = await run_parse(_merge_sources, parts, prev.index if prev else None)
+    snap = Snapshot(sources=sources, workbooks=workbooks, validated=validated, index=index)
+    _SNAPSHOT = snap
+    evict_stale_indexes()
+    if prev is None or prev.versions() != snap.versions():
+        await asyncio.to_thread(save_snapshot, snap)
+    return snap
+
+async def current_snapshot() -> Snapshot:
+    """Snapshot vigente; solo descarga en el request si todavía no hay ninguno."""
+    snap = _SNAPSHOT
+    if snap is None or snap.sources != configured_sources():
+        snap = await refresh_snapshot()
+    return snap
+
+# ===== snapshot persistido en disco (arranque en frío) =====
+
+# subir si cambia lo que se guarda: los archivos viejos se ignoran
+SNAPSHOT_FORMAT = 1
+
+def _dump_indexes(roots: list) -> tuple:
+    """
+    Índices como datos planos (JSON), cada objeto una sola vez y numerado. De
+    una hoja se guardan solo las filas ({DNI -> campos}): cuerpos, ETags y
+    hashes salen de ahí; de los combinados, los números de sus partes (se
+    vuelven a combinar). Devuelve (número de cada raíz, lista de índices).
+    """
+    ids, out = {}, []
+
+    def dump(index: DriverIndex) -> int:
+        n = ids.get(id(index))
+        if n is not None:
+            return n
+        if index.origin is not None:
+            item = {
+                "header_row": index.header_row, "kind": index.kind, "first_sheet": index.first_sheet,
+                "parts": {name: dump(part) for name, part in index.parts.items()},
+                "first": dump(index.first) if index.first is not None else None,
             }
+        else:
+            item = {"header_row": index.header_row, "rows": {dni: _fields(rec) for dni, rec in index.items()}}
+        ids[id(index)] = n = len(out)
+        out.append(item)
+        return n
+
+    return [dump(index) for index in roots], out
+
+def _load_indexes(items: list) -> list:
+    """Inversa de _dump_indexes: las partes (y la primera hoja) vienen antes que su combinado."""
+    out = []
+    for item in items:
+        if "parts" in item:
+            parts = {name: out[n] for name, n in item["parts"].items()}
+            index = DriverIndex.merge(parts, item["header_row"], item["kind"])
+            index.first_sheet = item["first_sheet"]
+            index.first = out[item["first"]] if item["first"] is not None else None
+        else:
+            index = DriverIndex.from_rows({dni: tuple(f) for dni, f in item["rows"].items()}, item["header_row"])
+        out.append(index)
+    return out
+
+def _index_settings() -> dict:
+    """Lo que cambia los índices de una misma versión del Excel: si no coincide, el snapshot no sirve."""
+    return {"index_sheets": INDEX_SHEETS, "header_scan_rows": HEADER_SCAN_ROWS}
+
+def _workbook_path(version: str) -> str:
+    # cada Excel va aparte, en binario, con nombre por contenido: se escribe una vez por versión
+    return f"{SNAPSHOT_PATH}.{version[:32]}.xlsx"
+
+def _write_atomic(path: str, data: bytes):
+    # nombre impredecible y creado con O_EXCL; os.replace para no dejar archivos a medias
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".snapshot-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def save_snapshot(snap: Snapshot):
+    """Guarda los Excel + índices ya parseados de esas versiones (escritura atómica)."""
+    if not SNAPSHOT_PATH:
+        return
+    versions = set(snap.versions().values())
+    cached = [(key, index) for key, index in list(_INDEX_CACHE.items()) if key[0] in versions]
+    roots = [index for _, index in cached] + ([snap.index] if snap.index is not None else [])
+    refs, indexes = _dump_indexes(roots)
+    data = {
+        "format": SNAPSHOT_FORMAT,
+        "settings": _index_settings(),
+        "sources": [asdict(src) for src in snap.sources],
+        "workbooks": {
+            name: {**{k: v for k, v in asdict(wbf).items() if k != "content"}, "size": len(wbf.content)}
+            for name, wbf in snap.workbooks.items()
+        },
+        "validated": snap.validated,
+        "indexes": indexes,
+        "cache": [[*key, n] for (key, _), n in zip(cached, refs)],
+        "index": refs[-1] if snap.index is not None else None,
+    }
+    try:
+        os.makedirs(os.path.dirname(SNAPSHOT_PATH) or ".", mode=0o700, exist_ok=True)
+        keep = set()
+        for wbf in snap.workbooks.values():
+            path = _workbook_path(wbf.version)
+            keep.add(path)
+            if not os.path.exists(path) or os.path.getsize(path) != len(wbf.content):
+                _write_atomic(path, wbf.content)
+        _write_atomic(SNAPSHOT_PATH, orjson.dumps(data))
+    except OSError as e:
+        log.warning("No pude guardar el snapshot en %s: %r", SNAPSHOT_PATH, e)
+        return
+    # los Excel de versiones que ya no están en el snapshot
+    for path in glob.glob(glob.escape(SNAPSHOT_PATH) + ".*.xlsx"):
+        if path not in keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def load_snapshot() -> Optional[Snapshot]:
+    """
+    Publica el snapshot guardado si corresponde a las fuentes y a los ajustes
+    de indexado (_index_settings) configurados; el refresco en segundo plano
+    lo revalida después con su ETag. Son datos planos: los índices se rearman
+    acá, no se deserializan objetos.
+    """
+    global _SNAPSHOT
+    if not SNAPSHOT_PATH or not has_sources():
+        return None
+    try:
+        sources = configured_sources()
+    except HTTPException:
+        return None
+    try:
+        with open(SNAPSHOT_PATH, "rb") as f:
+            data = orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, orjson.JSONDecodeError) as e:
+        log.warning("Snapshot ilegible en %s, se ignora: %r", SNAPSHOT_PATH, e)
+        return None
+    if not isinstance(data, dict) or data.get("format") != SNAPSHOT_FORMAT:
+        return None
+    try:
+        if tuple(Source(**src) for src in data["sources"]) != sources or data["settings"] != _index_settings():
+            return None
+        workbooks = {}
+        for name, wbf in data["workbooks"].items():
+            wbf = dict(wbf)
+            size = wbf.pop("size")
+            with open(_workbook_path(wbf["version"]), "rb") as f:
+                content = f.read()
+            if len(content) != size:
+                raise ValueError(f"Excel de {name!r} incompleto")
+            workbooks[name] = WorkbookFile(content=content, **wbf)
+        indexes = _load_indexes(data["indexes"])
+        cache = {(version, sheet_name, H): indexes[n] for version, sheet_name, H, n in data["cache"]}
+        index = indexes[data["index"]] if data["index"] is not None else None
+        validated = dict(data["validated"])
+    except (OSError, KeyError, TypeError, ValueError, IndexError) as e:
+        log.warning("Snapshot con formato inesperado en %s, se ignora: %r", SNAPSHOT_PATH, e)
+        return None
+
+    for wbf in workbooks.values():
+        _WORKBOOKS[wbf.url] = wbf
+    with _INDEX_LOCK:
+        _INDEX_CACHE.update(cache)
+    snap = Snapshot(sources=sources, workbooks=workbooks, validated=validated, index=index)
+    _SNAPSHOT = snap
+    log.info("Snapshot cargado de %s (%s)", SNAPSHOT_PATH,
+             ", ".join(f"{name} {version[:12]}" for name, version in snap.versions().items()))
+    return snap
+
+async def _refresh_loop():
+    while True:
+        if has_sources():
+            try:
+                await refresh_snapshot()
+            except Exception as e:
+                # stale-while-revalidate: se sigue sirviendo el snapshot anterior
+                log.warning("No pude refrescar el Excel: %r", e)
+        await asyncio.sleep(REFRESH_INTERVAL)
+
+# ===== tokens en lote (endpoint admin + cli.py) =====
+
+TOKEN_FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+def load_keyring() -> Optional[Keyring]:
+    """Keyring desde SECRET_KEYS / SECRET_KEY (ValueError si SECRET_KEYS está mal)."""
+    return parse_keyring(os.getenv("SECRET_KEYS", ""), os.getenv("SECRET_KEY", "").strip())
+
+def iter_docs_from_lines(lines: Iterable) -> Iterator[str]:
+    """
+    DNIs de un listado: uno por línea o CSV (`,` o `;`, con comillas) con el DNI
+    en la primera columna. Si la primera fila no tiene dígitos es el
+    encabezado y se salta.
+    """
+    first = True
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8-sig", errors="replace")
+        if not line.strip():
+            continue
+        # el separador se elige por línea: hay listados que mezclan , y ;
+        delimiter = ";" if line.count(";") > line.count(",") else ","
+        row = next(csv.reader([line], delimiter=delimiter), [])
+        doc = normalize(row[0]) if row else ""
+        if first:
+            first = False
+            if not any(ch.isdigit() for ch in doc):
+                continue
+        if doc:
+            yield doc
+
+def driver_url(base_url: str, doc: str, t: str) -> str:
+    """URL que va dentro del QR."""
+    return f"{base_url}/driver?" + urlencode({"doc": doc, "t": t})
+
+def iter_token_rows(docs: Iterable, keyring: Keyring, base_url: str, fmt: str, chunk_rows: int = 1000) -> Iterator[bytes]:
+    """
+    Filas doc/token/url en CSV o NDJSON, en bloques de `chunk_rows` para no
+    acumular todo en memoria. Las firmas usan el HMAC pre-armado del keyring.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    if fmt == "csv":
+        writer.writerow(["doc", "token", "url"])
+    chunk = []
+    for doc in docs:
+        t = keyring.sign(doc)
+        url = driver_url(base_url, doc, t)
+        if fmt == "csv":
+            writer.writerow([doc, t, url])
+        else:
+            chunk.append(orjson.dumps({"doc": doc, "token": t, "url": url}))
+        if len(chunk) >= chunk_rows or buf.tell() >= chunk_rows * 100:
+            yield _flush_rows(buf, chunk)
+    yield _flush_rows(buf, chunk)
+
+def _flush_rows(buf: io.StringIO, chunk: list) -> bytes:
+    out = buf.getvalue().encode() + b"".join(line + b"\n" for line in chunk)
+    buf.seek(0)
+    buf.truncate()
+    chunk.clear()
+    return out
+
+# ===== QR (imágenes) =====
+
+class ImageCache:
+    """LRU de QRs ya renderizados, por (doc, kid, size, formato, base_url)."""
+
+    def __init__(self, max_entries: int):
+        self._max_entries = max_entries
+        self._images: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            data = self._images.get(key)
+            if data is not None:
+                self._images.move_to_end(key)
+        CACHE.labels("qr", "hit" if data is not None else "miss").inc()
+        return data
 
-    raise HTTPException(status_code=404, detail="Conductor no encontrado por DNI en la columna E")
+    def put(self, key, data: bytes):
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            self._images[key] = data
+            self._images.move_to_end(key)
+            while len(self._images) > self._max_entries:
+                self._images.popitem(last=False)
+
+_QR_CACHE = ImageCache(QR_CACHE_SIZE)
+_QR_POOL: Optional[ProcessPoolExecutor] = None
+_QR_CHUNK = 64   # QRs por tarea del pool
+
+def _qr_pool() -> Optional[ProcessPoolExecutor]:
+    global _QR_POOL
+    if _QR_POOL is None and QR_WORKERS > 1:
+        # spawn: los workers solo importan qr_render (no app ni el estado de uvicorn)
+        _QR_POOL = ProcessPoolExecutor(QR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _QR_POOL
+
+def close_qr_pool():
+    global _QR_POOL
+    if _QR_POOL is not None:
+        _QR_POOL.shutdown(wait=False, cancel_futures=True)
+        _QR_POOL = None
+
+async def render_qr_images(docs: list, keyring: Keyring, base_url: str, fmt: str, size: int) -> list:
+    """
+    [(doc, bytes)] en el orden de `docs`. Lo que no está en _QR_CACHE se
+    renderiza en bloques repartidos en el pool de procesos.
+    """
+    keys = [(doc, keyring.active_kid, size, fmt, base_url) for doc in docs]
+    images = [_QR_CACHE.get(key) for key in keys]
+    missing = [i for i, data in enumerate(images) if data is None]
+    if missing:
+        urls = [driver_url(base_url, docs[i], keyring.sign(docs[i])) for i in missing]
+        with stage("qr_render"):
+            pool = _qr_pool()
+            if pool is None:
+                rendered = [await asyncio.to_thread(qr_render.render_many, urls, fmt, size)]
+            else:
+                loop = asyncio.get_running_loop()
+                rendered = await asyncio.gather(*(
+                    loop.run_in_executor(pool, qr_render.render_many, urls[i:i + _QR_CHUNK], fmt, size)
+                    for i in range(0, len(urls), _QR_CHUNK)
+                ))
+        for i, data in zip(missing, (img for block in rendered for img in block)):
+            images[i] = data
+            _QR_CACHE.put(keys[i], data)
+    return list(zip(docs, images))
 
 # ===== endpoints =====
 
@@ -115,32 +1354,226 @@ def read_driver_from_excel(
 def health():
     return {"ok": True, "ts": int(time.time())}
 
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# SECRET_KEYS / SECRET_KEY se leen del entorno una sola vez (primer request)
+_KEYRING: Optional[Keyring] = None
+
+def _keyring() -> Keyring:
+    global _KEYRING
+    if _KEYRING is None:
+        try:
+            _KEYRING = load_keyring()
+        except ValueError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    if _KEYRING is None:
+        raise HTTPException(status_code=500, detail="Falta variable de entorno: SECRET_KEY o SECRET_KEYS")
+    return _KEYRING
+
+def _require_sources():
+    """Para los endpoints que leen el Excel (los tokens de un listado subido no lo necesitan)."""
+    if not has_sources():
+        raise HTTPException(status_code=500, detail="Falta variable de entorno: ONEDRIVE_URL u ONEDRIVE_SOURCES")
+
 @app.get("/driver")
-def get_driver(
+@count_responses("driver")
+async def get_driver(
     doc: str = Query(..., description="DNI/CE exacto tal como aparece en la columna E"),
     t: str   = Query(..., description="token HMAC"),
-    sheet_name: Optional[str] = Query(None, description="Nombre de hoja. Vacío = primera"),
-    header_row: int = Query(12, description="Fila de encabezados, 1-based"),
+    sheet_name: Optional[str] = Query(None, description='Nombre de hoja. Vacío = primera (y si no está, todas), "*" = todas'),
+    header_row: int = Query(DEFAULT_HEADER_ROW, ge=1, le=MAX_HEADER_ROW, description="Fila de encabezados, 1-based (pista: si no están ahí se buscan)"),
+    if_none_match: Optional[str] = Header(None),
 ):
-    SECRET_KEY = os.getenv("SECRET_KEY", "").strip()
-    ONEDRIVE_URL = os.getenv("ONEDRIVE_URL", "").strip()
-
-    if not SECRET_KEY or not ONEDRIVE_URL:
-        raise HTTPException(status_code=500, detail="Faltan variables de entorno: SECRET_KEY y/o ONEDRIVE_URL")
+    keyring = _keyring()
+    _require_sources()
+    timings = start_request_timings()
 
     # 1) verificar token
-    if not verify(doc, t, SECRET_KEY):
+    with stage("verify"):
+        ok = keyring.verify(doc, t)
+    if not ok:
         raise HTTPException(status_code=401, detail="token inválido")
 
-    # 2) descargar Excel fresco
-    url = od_to_download(ONEDRIVE_URL)
-    url = f"{url}{'&' if '?' in url else '?'}_cb={int(time.time())}"
-    r = requests.get(url, timeout=60, headers={"Cache-Control": "no-cache"})
-    if r.status_code != 200:
-        raise HTTPException(status_code=502, detail=f"No pude descargar Excel ({r.status_code})")
+    # 2) snapshot vigente (lo mantiene al día _refresh_loop)
+    snap = await current_snapshot()
+
+    # 3) buscar en el índice (solo se parsea, fuera del event loop, si cambió la versión)
+    dni = normalize(doc)
+    index = await driver_index_for(snap, sheet_name, header_row, dni)
+    with stage("lookup"):
+        body = index.bodies.get(dni)
+    if body is None:
+        raise HTTPException(
+            status_code=404, detail="Conductor no encontrado por DNI en la columna E",
+            headers={"Server-Timing": server_timing(timings)},
+        )
+    etag = index.etags[dni]
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={DRIVER_MAX_AGE}",
+        # antigüedad de los datos: segundos desde la última revalidación con OneDrive
+        "X-Data-Age": str(int(snap.age())),
+    }
+    for kind, name in index.where(dni).items():
+        headers[f"X-Driver-{kind.title()}"] = quote(name)
+    # re-escaneo del mismo QR con el dato sin cambios: 304 sin cuerpo
+    if etag_matches(if_none_match, etag):
+        headers["Server-Timing"] = server_timing(timings)
+        return Response(status_code=304, headers=headers)
+    # cuerpo pre-serializado al armar el índice: no hay json.dumps en el camino caliente
+    with stage("serialize"):
+        resp = Response(content=body, media_type="application/json", headers=headers)
+    resp.headers["Server-Timing"] = server_timing(timings)
+    return resp
+
+class DriverQuery(BaseModel):
+    doc: str
+    t: str
+
+class DriverBatch(BaseModel):
+    items: List[DriverQuery]
+    sheet_name: Optional[str] = None
+    header_row: int = Field(DEFAULT_HEADER_ROW, ge=1, le=MAX_HEADER_ROW)
+
+@app.post("/driver/batch")
+@count_responses("driver_batch")
+async def get_drivers_batch(body: DriverBatch):
+    """
+    Verifica varios (doc, t) contra UN mismo snapshot del Excel. Cada item
+    devuelve status: "found" (con driver), "not_found" o "invalid_token".
+    """
+    keyring = _keyring()
+    _require_sources()
+    timings = start_request_timings()
+    if len(body.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Demasiados items (máximo {BATCH_MAX_ITEMS})")
+
+    snap = await current_snapshot()
+    # cada item se serializa al vuelo (orjson) reutilizando el JSON ya armado del conductor
+    results = []
+    for item in body.items:
+        doc_json = orjson.dumps(item.doc)
+        with stage("verify"):
+            ok = keyring.verify(item.doc, item.t)
+        if not ok:
+            results.append(b'{"doc":' + doc_json + b',"status":"invalid_token"}')
+            continue
+        dni = normalize(item.doc)
+        index = await driver_index_for(snap, body.sheet_name, body.header_row, dni)
+        with stage("lookup"):
+            found = dni in index
+        if not found:
+            results.append(b'{"doc":' + doc_json + b',"status":"not_found"}')
+        else:
+            # con índices combinados: ,"source":...,"sheet":...
+            where = b"," + orjson.dumps(index.where(dni))[1:-1] if index.origin is not None else b""
+            results.append(b'{"doc":' + doc_json + b',"status":"found"' + where + b',"driver":' + index.driver_json(dni) + b"}")
+    with stage("serialize"):
+        resp = Response(content=b'{"ok":true,"results":[' + b",".join(results) + b"]}", media_type="application/json")
+    resp.headers["X-Data-Age"] = str(int(snap.age()))
+    resp.headers["Server-Timing"] = server_timing(timings)
+    return resp
+
+def _require_admin(authorization: Optional[str]):
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "").strip()
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Endpoints admin deshabilitados (falta ADMIN_TOKEN)")
+    scheme, _, value = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secure_eq(value.strip(), ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="token admin inválido", headers={"WWW-Authenticate": "Bearer"})
+
+def _base_url(request: Request) -> str:
+    return PUBLIC_BASE_URL or str(request.base_url).rstrip("/")
+
+def _tokens_response(docs: Iterable, request: Request, fmt: str) -> StreamingResponse:
+    if fmt not in TOKEN_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format debe ser uno de {sorted(TOKEN_FORMATS)}")
+    return StreamingResponse(
+        iter_token_rows(docs, _keyring(), _base_url(request), fmt),
+        media_type=TOKEN_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="tokens.{fmt}"'},
+    )
+
+@app.get("/admin/tokens")
+async def mint_tokens_from_workbook(
+    request: Request,
+    format: str = Query("csv", description="csv | ndjson"),
+    sheet_name: Optional[str] = Query(ALL_SHEETS, description='Nombre de hoja. "*" = todas (default), vacío = primera'),
+    header_row: int = Query(DEFAULT_HEADER_ROW, ge=1, le=MAX_HEADER_ROW, description="Fila de encabezados, 1-based (pista: si no están ahí se buscan)"),
+    authorization: Optional[str] = Header(None),
+):
+    """
+    doc/token/url de todos los DNIs del snapshot vigente, en streaming. Por
+    default de todas las hojas: /driver sin hoja también las busca a todas.
+    """
+    _require_admin(authorization)
+    _require_sources()
+    snap = await current_snapshot()
+    index = await snapshot_index(snap, sheet_name, header_row)
+    return _tokens_response(list(index), request, format)
+
+@app.post("/admin/tokens")
+async def mint_tokens_from_upload(
+    request: Request,
+    file: UploadFile = File(..., description="DNIs, uno por línea (o CSV con el DNI en la primera columna)"),
+    format: str = Query("csv", description="csv | ndjson"),
+    authorization: Optional[str] = Header(None),
+):
+    """doc/token/url para un listado subido."""
+    _require_admin(authorization)
+    # FastAPI cierra el archivo al volver del handler: los DNIs se leen antes
+    docs = await asyncio.to_thread(lambda: list(iter_docs_from_lines(file.file)))
+    return _tokens_response(docs, request, format)
+
+def _check_qr_params(fmt: str, size: int):
+    if fmt not in qr_render.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format debe ser uno de {sorted(qr_render.FORMATS)}")
+    if not 1 <= size <= QR_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"size debe estar entre 1 y {QR_MAX_SIZE}")
+
+@app.get("/admin/qr")
+async def get_qr_image(
+    request: Request,
+    doc: str = Query(..., description="DNI/CE"),
+    format: str = Query("png", description="png | svg"),
+    size: int = Query(8, description="píxeles por módulo"),
+    authorization: Optional[str] = Header(None),
+):
+    """QR con la URL firmada de /driver para `doc`."""
+    _require_admin(authorization)
+    _check_qr_params(format, size)
+    dni = normalize(doc)
+    if not dni:
+        raise HTTPException(status_code=400, detail="doc vacío")
+    [(_, data)] = await render_qr_images([dni], _keyring(), _base_url(request), format, size)
+    return Response(content=data, media_type=qr_render.FORMATS[format])
+
+class QRBatch(BaseModel):
+    docs: Optional[List[str]] = None   # None = todos los DNIs del snapshot
+    format: str = "png"
+    size: int = 8
+    sheet_name: Optional[str] = ALL_SHEETS   # como /admin/tokens: todas las hojas
+    header_row: int = Field(DEFAULT_HEADER_ROW, ge=1, le=MAX_HEADER_ROW)
 
-    # 3) parsear Excel sin pandas
-    data = read_driver_from_excel(r.content, sheet_name, header_row, doc)
-    return JSONResponse({"ok": True, "driver": data})
+@app.post("/admin/qr/batch")
+async def get_qr_batch(body: QRBatch, request: Request, authorization: Optional[str] = Header(None)):
+    """ZIP con un QR por DNI (<dni>.png / <dni>.svg) para imprimir fotochecks."""
+    _require_admin(authorization)
+    _check_qr_params(body.format, body.size)
+    if body.docs is None:
+        _require_sources()
+        snap = await current_snapshot()
+        docs = list(await snapshot_index(snap, body.sheet_name, body.header_row))
+    else:
+        docs = list(dict.fromkeys(filter(None, map(normalize, body.docs))))
+    images = await render_qr_images(docs, _keyring(), _base_url(request), body.format, body.size)
+    data = await asyncio.to_thread(qr_render.zip_images, [(f"{doc}.{body.format}", img) for doc, img in images], body.format)
+    return Response(
+        content=data,
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="qr.zip"'},
+    )
 
 # NOTA: El Procfile en Render arrancará uvicorn/gunicorn como siempre.
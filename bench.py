@@ -0,0 +1,225 @@
+"""
+Benchmarks de lectura del Excel de conductores.
+
+Genera workbooks sintéticos con el mismo formato que el real (encabezados en
+la fila 12, las 4 columnas requeridas en D, E, AF y AG entre 40 columnas,
+shared strings y fechas) y mide parseo, armado del índice y búsquedas (acierto,
+fallo, primera y última fila). Imprime JSON para comparar entre versiones:
+
+    python bench.py                          # 1k, 10k y 100k filas
+    python bench.py --rows 1000 10000 --repeat 5 --out bench.json
+"""
+import argparse, datetime, hashlib, io, json, os, platform, random, re, statistics, sys, time, timeit, zipfile
+
+from openpyxl import Workbook, load_workbook, __version__ as openpyxl_version
+from openpyxl.cell import WriteOnlyCell
+
+import app
+import xlsx_stream
+
+HEADER_ROW = 12
+N_COLS = 40
+# columna 1-based -> encabezado requerido (D, E, AF, AG)
+REQUIRED_AT = {
+    4: "NOMBRES Y APELLIDOS",
+    5: "DNI / CE",
+    32: "FECHA DE VIGENCIA DE HABILITACIÓN DE LICENCIA INTERNA",
+    33: "ESTATUS DE PROCESO DE HABILITACION",
+}
+STATUSES = ["HABILITADO", "OBSERVADO", "EN PROCESO", "NO HABILITADO"]
+FIRST_DNI = 40000000
+
+
+def dni_at(i: int) -> str:
+    return str(FIRST_DNI + i)
+
+
+def make_workbook(rows: int, seed: int = 0) -> bytes:
+    """
+    xlsx sintético con `rows` conductores (DNI = FIRST_DNI + i). openpyxl en
+    modo write-only escribe los textos inline y sin <dimension>; después se
+    reescribe el paquete como lo guarda Excel (ver _as_excel_saves_it).
+    """
+    rnd = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("CONDUCTORES")
+
+    for r in range(1, HEADER_ROW):
+        ws.append([f"REPORTE DE HABILITACIÓN - fila {r}"] if r in (1, 3) else [])
+    ws.append([REQUIRED_AT.get(c, f"CAMPO {c}") for c in range(1, N_COLS + 1)])
+
+    base = datetime.datetime(2025, 1, 1)
+    for i in range(rows):
+        row = []
+        for c in range(1, N_COLS + 1):
+            if c == 4:
+                row.append(f"APELLIDO{i % 997} APELLIDO{i % 389} NOMBRE{i % 211}")
+            elif c == 5:
+                # mezcla de DNI guardados como número y como texto
+                row.append(FIRST_DNI + i if i % 2 else dni_at(i))
+            elif c == 32:
+                cell = WriteOnlyCell(ws, value=base + datetime.timedelta(days=rnd.randrange(730)))
+                cell.number_format = "dd/mm/yyyy"
+                row.append(cell)
+            elif c == 33:
+                row.append(STATUSES[rnd.randrange(len(STATUSES))])
+            elif c % 3 == 0:
+                row.append(rnd.randrange(1000))
+            else:
+                row.append(f"VALOR {c}-{rnd.randrange(50)}")
+        ws.append(row)
+
+    out = io.BytesIO()
+    wb.save(out)
+    return _as_excel_saves_it(out.getvalue(), f"A1:{_col_letter(N_COLS)}{HEADER_ROW + rows}")
+
+
+def _col_letter(col: int) -> str:
+    letters = ""
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+_INLINE = re.compile(r't="inlineStr"><is>(<t[^>]*>.*?</t>)</is>')
+
+def _as_excel_saves_it(data: bytes, dimension: str) -> bytes:
+    """
+    Pasa los textos inline de la hoja a xl/sharedStrings.xml (cada texto una
+    vez, las celdas con t="s" e índice) y agrega <dimension>, como el Excel real.
+    """
+    src = zipfile.ZipFile(io.BytesIO(data))
+    sheet = src.read("xl/worksheets/sheet1.xml").decode()
+    strings, count = {}, 0
+
+    def shared(m):
+        nonlocal count
+        count += 1
+        idx = strings.setdefault(m.group(1), len(strings))
+        return f't="s"><v>{idx}</v>'
+
+    sheet = _INLINE.sub(shared, sheet)
+    sheet = sheet.replace("</sheetPr>", f'</sheetPr><dimension ref="{dimension}" />', 1)
+    sst = (
+        '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+        f' count="{count}" uniqueCount="{len(strings)}">'
+        + "".join(f"<si>{t}</si>" for t in strings)
+        + "</sst>"
+    )
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for name in src.namelist():
+            part = src.read(name)
+            if name == "xl/worksheets/sheet1.xml":
+                part = sheet.encode()
+            elif name == "[Content_Types].xml":
+                part = part.replace(b"</Types>", b'<Override PartName="/xl/sharedStrings.xml" ContentType='
+                                    b'"application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml" /></Types>')
+            elif name == "xl/_rels/workbook.xml.rels":
+                part = part.replace(b"</Relationships>", b'<Relationship Type="http://schemas.openxmlformats.org/'
+                                    b'officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"'
+                                    b' Id="rIdSst" /></Relationships>')
+            dst.writestr(name, part)
+        dst.writestr("xl/sharedStrings.xml", sst.encode())
+    return out.getvalue()
+
+
+def load_or_make(rows: int, cache_dir: str) -> bytes:
+    path = os.path.join(cache_dir, f"drivers-{rows}-sst.xlsx")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    data = make_workbook(rows)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return data
+
+
+def timed(fn, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return {"min_s": min(runs), "median_s": statistics.median(runs), "runs": repeat}
+
+
+def per_call(fn, number: int) -> dict:
+    best = min(timeit.repeat(fn, number=number, repeat=3))
+    return {"per_call_us": best / number * 1e6, "number": number}
+
+
+def parse_pass(data: bytes, fast: bool):
+    """Solo lectura de filas (columnas D..AG), sin armar el índice."""
+    if fast:
+        wb = xlsx_stream.XlsxReader(data)
+    else:
+        wb = load_workbook(io.BytesIO(data), data_only=True, read_only=True)
+    ws = wb.worksheets[0]
+    for _ in ws.iter_rows(min_row=HEADER_ROW + 1, min_col=4, max_col=33, values_only=True):
+        pass
+    wb.close()
+
+
+def build_index(data: bytes, fast: bool) -> dict:
+    prev, app.XLSX_FAST_READER = app.XLSX_FAST_READER, fast
+    try:
+        return app.build_driver_index(data, None, HEADER_ROW)
+    finally:
+        app.XLSX_FAST_READER = prev
+
+
+def bench_size(rows: int, repeat: int, cache_dir: str) -> dict:
+    data = load_or_make(rows, cache_dir)
+    result = {"rows": rows, "bytes": len(data), "parse": {}, "index_build": {}}
+    for name, fast in (("xlsx_stream", True), ("openpyxl", False)):
+        result["parse"][name] = timed(lambda: parse_pass(data, fast), repeat)
+        result["index_build"][name] = timed(lambda: build_index(data, fast), repeat)
+
+    # la búsqueda que hace GET /driver sobre el índice del snapshot: normalizar
+    # el DNI y tomar el cuerpo ya serializado
+    index = app.get_driver_index(data, None, HEADER_ROW, hashlib.sha256(data).hexdigest())
+    bodies, normalize = index.bodies, app.normalize
+
+    def lookup(dni):
+        return lambda: bodies.get(normalize(dni))
+
+    number = 20000
+    result["lookup"] = {
+        "hit": per_call(lookup(dni_at(rows // 2)), number),
+        "miss": per_call(lookup("00000000"), number),
+        "first_row": per_call(lookup(dni_at(0)), number),
+        "last_row": per_call(lookup(dni_at(rows - 1)), number),
+    }
+    return result
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--cache-dir", default=".bench_cache", help="workbooks generados (se reutilizan)")
+    ap.add_argument("--out", help="archivo JSON de salida (default: stdout)")
+    args = ap.parse_args(argv)
+
+    report = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "app_version": app.app.version,
+        "python": platform.python_version(),
+        "openpyxl": openpyxl_version,
+        "platform": platform.platform(),
+        "results": [bench_size(n, args.repeat, args.cache_dir) for n in args.rows],
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
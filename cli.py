@@ -0,0 +1,135 @@
+"""
+Herramientas de línea de comandos para operar el backend.
+
+    python cli.py tokens --xlsx conductores.xlsx > tokens.csv
+    python cli.py tokens --dnis dnis.txt --format ndjson --out tokens.ndjson
+    python cli.py tokens                     # DNIs de ONEDRIVE_URL / ONEDRIVE_SOURCES
+    python cli.py badges --xlsx conductores.xlsx --format svg --out qr.zip
+
+Las claves salen de SECRET_KEYS / SECRET_KEY, igual que en la app, y los
+tokens se firman con la clave activa.
+"""
+import argparse, asyncio, sys
+
+import app
+import qr_render
+
+
+def _docs_from_snapshot(sheet_name, header_row) -> list:
+    async def run():
+        try:
+            snap = await app.refresh_snapshot()
+            return list(await app.snapshot_index(snap, sheet_name, header_row))
+        finally:
+            await app.close_http_client()
+    return asyncio.run(run())
+
+
+def _keyring_or_exit():
+    try:
+        keyring = app.load_keyring()
+    except ValueError as e:
+        sys.exit(f"SECRET_KEYS inválido: {e}")
+    if keyring is None:
+        sys.exit("Falta SECRET_KEYS o SECRET_KEY")
+    return keyring
+
+
+def _base_url_or_exit(args) -> str:
+    base_url = (args.base_url or app.PUBLIC_BASE_URL).rstrip("/")
+    if not base_url:
+        # una URL relativa en el QR no la abre ningún celular
+        sys.exit("Falta la URL pública: indicar --base-url o definir PUBLIC_BASE_URL")
+    return base_url
+
+
+def _docs(args):
+    """DNIs de --dnis, de --xlsx o de las fuentes configuradas."""
+    if args.dnis == "-":
+        return app.iter_docs_from_lines(sys.stdin.buffer)
+    if args.dnis:
+        with open(args.dnis, "rb") as f:
+            return list(app.iter_docs_from_lines(f))
+    if args.xlsx:
+        with open(args.xlsx, "rb") as f:
+            return list(app.build_driver_index(f.read(), args.sheet_name, args.header_row))
+    if not app.has_sources():
+        sys.exit("Indicar --dnis, --xlsx o definir ONEDRIVE_URL / ONEDRIVE_SOURCES")
+    return _docs_from_snapshot(args.sheet_name, args.header_row)
+
+
+def _open_out(path):
+    return sys.stdout.buffer if path in (None, "-") else open(path, "wb")
+
+
+def cmd_tokens(args) -> int:
+    keyring = _keyring_or_exit()
+    base_url = _base_url_or_exit(args)
+    docs = _docs(args)
+    out = _open_out(args.out)
+    try:
+        for chunk in app.iter_token_rows(docs, keyring, base_url, args.format):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return 0
+
+
+def cmd_badges(args) -> int:
+    if not 1 <= args.size <= app.QR_MAX_SIZE:
+        sys.exit(f"--size debe estar entre 1 y {app.QR_MAX_SIZE}")
+    keyring = _keyring_or_exit()
+    base_url = _base_url_or_exit(args)
+    docs = list(dict.fromkeys(_docs(args)))
+
+    async def run():
+        try:
+            return await app.render_qr_images(docs, keyring, base_url, args.format, args.size)
+        finally:
+            app.close_qr_pool()
+    images = asyncio.run(run())
+    data = qr_render.zip_images([(f"{doc}.{args.format}", img) for doc, img in images], args.format)
+    out = _open_out(args.out)
+    try:
+        out.write(data)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(f"{len(images)} QRs", file=sys.stderr)
+    return 0
+
+
+def _add_sources(p):
+    src = p.add_mutually_exclusive_group()
+    src.add_argument("--dnis", help="archivo con un DNI por línea ('-' = stdin)")
+    src.add_argument("--xlsx", help="Excel local con el formato de conductores")
+    p.add_argument("--sheet-name", default=app.ALL_SHEETS, help="hoja del Excel (default: '*' = todas; '' = primera)")
+    p.add_argument("--header-row", type=int, default=app.DEFAULT_HEADER_ROW)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    tk = sub.add_parser("tokens", help="generar doc/token/url en lote")
+    _add_sources(tk)
+    tk.add_argument("--format", choices=sorted(app.TOKEN_FORMATS), default="csv")
+    tk.add_argument("--base-url", default="", help="base de las URLs (default: PUBLIC_BASE_URL)")
+    tk.add_argument("--out", help="archivo de salida (default: stdout)")
+    tk.set_defaults(func=cmd_tokens)
+
+    bd = sub.add_parser("badges", help="ZIP con un QR por DNI")
+    _add_sources(bd)
+    bd.add_argument("--format", choices=sorted(qr_render.FORMATS), default="png")
+    bd.add_argument("--size", type=int, default=8, help="píxeles por módulo")
+    bd.add_argument("--base-url", default="", help="base de las URLs (default: PUBLIC_BASE_URL)")
+    bd.add_argument("--out", help="archivo .zip de salida (default: stdout)")
+    bd.set_defaults(func=cmd_badges)
+
+    args = ap.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
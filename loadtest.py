@@ -0,0 +1,228 @@
+"""
+Prueba de carga de punta a punta, sin salir de la máquina.
+
+Levanta un servidor HTTP local que se hace pasar por el link de descarga de
+SharePoint (latencia configurable, ETag/304, 429 de throttling y cuerpos
+lentos), arranca la app con uvicorn apuntando a él y dispara `/driver` a un
+RPS objetivo con tokens válidos de `sign`. Reporta throughput y latencias
+p50/p95/p99 en JSON:
+
+    python loadtest.py --rps 200 --duration 30
+    python loadtest.py --rows 20000 --latency-ms 300 --throttle 0.2 --slow-body-kbps 500
+"""
+import argparse, asyncio, hashlib, json, math, os, random, socket, subprocess, sys, threading, time
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+import bench
+from app import sign
+
+SECRET = "loadtest-secret"
+
+
+# ===== OneDrive falso =====
+
+class FakeOneDrive(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, body: bytes, latency_ms: float, throttle: float, slow_body_kbps: float):
+        super().__init__(("127.0.0.1", 0), _FakeHandler)
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+        self.last_modified = formatdate(time.time(), usegmt=True)
+        self.latency_ms = latency_ms
+        self.throttle = throttle
+        self.slow_body_kbps = slow_body_kbps
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/personal/flota/conductores.xlsx"
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    server: FakeOneDrive
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        srv = self.server
+        srv.count("requests")
+        if srv.latency_ms:
+            time.sleep(srv.latency_ms / 1000)
+        if srv.throttle and random.random() < srv.throttle:
+            srv.count("429")
+            self.send_response(429)
+            self.send_header("Retry-After", "5")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == srv.etag:
+            srv.count("304")
+            self.send_response(304)
+            self.send_header("ETag", srv.etag)
+            self.end_headers()
+            return
+
+        srv.count("200")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        self.send_header("Content-Length", str(len(srv.body)))
+        self.send_header("ETag", srv.etag)
+        self.send_header("Last-Modified", srv.last_modified)
+        self.end_headers()
+        if not srv.slow_body_kbps:
+            self.wfile.write(srv.body)
+            return
+        chunk = 16 * 1024
+        for i in range(0, len(srv.body), chunk):
+            self.wfile.write(srv.body[i:i + chunk])
+            time.sleep(chunk / (srv.slow_body_kbps * 1024))
+
+
+# ===== app bajo prueba =====
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(port: int, onedrive_url: str, refresh_interval: float) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SECRET_KEY=SECRET,
+        ONEDRIVE_URL=onedrive_url,
+        REFRESH_INTERVAL=str(refresh_interval),
+        SNAPSHOT_PATH="",          # arranque en frío: la primera carga baja del OneDrive falso
+    )
+    # que nada del entorno lleve la app a otro Excel (SharePoint real) ni a otras claves
+    for name in ("ONEDRIVE_SOURCES", "INDEX_SHEETS", "SECRET_KEYS"):
+        env.pop(name, None)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+
+
+def wait_healthy(base: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"la app no respondió /health en {timeout}s")
+
+
+# ===== generador de carga =====
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    # nearest-rank
+    k = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+
+async def drive(base: str, rows: int, rps: float, duration: float, miss_ratio: float) -> dict:
+    latencies, statuses = [], Counter()
+    total = int(rps * duration)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=512)
+
+    async with httpx.AsyncClient(base_url=base, timeout=60, limits=limits) as client:
+        async def one(doc: str):
+            t0 = time.perf_counter()
+            try:
+                r = await client.get("/driver", params={"doc": doc, "t": sign(doc, SECRET)})
+                statuses[str(r.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[e.__class__.__name__] += 1
+                return
+            latencies.append(time.perf_counter() - t0)
+
+        tasks = []
+        start = time.perf_counter()
+        for i in range(total):
+            # carga abierta: los requests salen a ritmo fijo aunque la app se atrase
+            delay = start + i / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            doc = "00000000" if random.random() < miss_ratio else bench.dni_at(random.randrange(rows))
+            tasks.append(asyncio.create_task(one(doc)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "target_rps": rps,
+        "sent": total,
+        "completed": len(latencies),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "status": dict(statuses),
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": (latencies[-1] * 1000) if latencies else float("nan"),
+        },
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=5000, help="conductores en el Excel sintético")
+    ap.add_argument("--rps", type=float, default=100)
+    ap.add_argument("--duration", type=float, default=20, help="segundos de carga")
+    ap.add_argument("--miss-ratio", type=float, default=0.05, help="fracción de DNIs inexistentes")
+    ap.add_argument("--latency-ms", type=float, default=100, help="latencia del OneDrive falso")
+    ap.add_argument("--throttle", type=float, default=0.0, help="fracción de descargas que responden 429")
+    ap.add_argument("--slow-body-kbps", type=float, default=0.0, help="limitar el cuerpo a N KiB/s (0 = sin límite)")
+    ap.add_argument("--refresh-interval", type=float, default=5, help="REFRESH_INTERVAL de la app")
+    ap.add_argument("--cache-dir", default=".bench_cache")
+    ap.add_argument("--out", help="archivo JSON de salida (default: stdout)")
+    args = ap.parse_args(argv)
+
+    fake = FakeOneDrive(bench.load_or_make(args.rows, args.cache_dir), args.latency_ms, args.throttle, args.slow_body_kbps)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    proc = start_app(port, fake.url, args.refresh_interval)
+    try:
+        wait_healthy(base)
+        result = asyncio.run(drive(base, args.rows, args.rps, args.duration, args.miss_ratio))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+        fake.shutdown()
+
+    report = {
+        "config": vars(args),
+        "result": result,
+        "onedrive": dict(fake.stats),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""
+Render de QRs (PNG/SVG) con segno.
+
+Funciones puras y a nivel de módulo para poder mandarlas a un
+ProcessPoolExecutor: el render es CPU puro y en lotes grandes (toda la flota)
+conviene repartirlo entre procesos. La caché y los endpoints viven en app.py.
+"""
+import io, zipfile
+
+import segno
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+# corrección de errores M: resiste manchas/desgaste del fotocheck sin agrandar mucho el QR
+ERROR_LEVEL = "m"
+BORDER = 4   # zona de silencio estándar (módulos)
+
+
+def render(url: str, fmt: str = "png", size: int = 8) -> bytes:
+    """QR de `url`; `size` = píxeles por módulo (en SVG, unidades de usuario)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"formato no soportado: {fmt!r}")
+    qr = segno.make(url, error=ERROR_LEVEL, boost_error=False)
+    out = io.BytesIO()
+    if fmt == "svg":
+        qr.save(out, kind="svg", scale=size, border=BORDER, xmldecl=False)
+    else:
+        qr.save(out, kind="png", scale=size, border=BORDER)
+    return out.getvalue()
+
+
+def render_many(urls: list, fmt: str, size: int) -> list:
+    """Un bloque de renders por tarea (menos ida y vuelta entre procesos)."""
+    return [render(url, fmt, size) for url in urls]
+
+
+def zip_images(images: list, fmt: str) -> bytes:
+    """ZIP con (nombre, bytes); los PNG ya vienen comprimidos y se guardan tal cual."""
+    compression = zipfile.ZIP_STORED if fmt == "png" else zipfile.ZIP_DEFLATED
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", compression) as zf:
+        for name, data in images:
+            zf.writestr(name, data)
+    return out.getvalue()
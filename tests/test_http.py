@@ -0,0 +1,222 @@
+"""
+Endpoints HTTP con TestClient contra un OneDrive falso (httpx.MockTransport).
+"""
+import io
+
+import httpx
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import Workbook
+
+import app
+from test_incremental_index import H, rows, workbook
+
+URL = "https://example.com/conductores.xlsx"
+SECRET = "secreto-de-prueba"
+SHEETS = {"MINA A": rows("1", "2"), "MINA B": rows("2", "3", tag=" B")}
+
+
+@pytest.fixture
+def onedrive(monkeypatch):
+    """Sirve el Excel de `onedrive.content` y cuenta las descargas."""
+    state = type("OneDrive", (), {"content": workbook(SHEETS), "downloads": 0})()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        state.downloads += 1
+        return httpx.Response(200, content=state.content, headers={"ETag": '"v1"'})
+
+    monkeypatch.setenv("ONEDRIVE_URL", URL)
+    monkeypatch.setenv("SECRET_KEY", SECRET)
+    monkeypatch.delenv("SECRET_KEYS", raising=False)
+    monkeypatch.delenv("ONEDRIVE_SOURCES", raising=False)
+    monkeypatch.setattr(app, "SNAPSHOT_PATH", "")
+    monkeypatch.setattr(app, "_SNAPSHOT", None)
+    monkeypatch.setattr(app, "_KEYRING", None)
+    monkeypatch.setattr(app, "_INDEX_CACHE", {})
+    monkeypatch.setattr(app, "_INDEX_ERRORS", {})
+    monkeypatch.setattr(app, "_SHEET_TITLES", {})
+    monkeypatch.setattr(app, "_WORKBOOKS", {})
+    monkeypatch.setattr(app, "_HTTP_CLIENT", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return state
+
+
+@pytest.fixture
+def client(onedrive):
+    # sin `with`: no corre el lifespan (ni el refresco en segundo plano)
+    return TestClient(app.app)
+
+
+def token(doc: str) -> str:
+    return app.sign(doc, SECRET)
+
+
+@pytest.mark.parametrize("header, match", [
+    (None, False),
+    ("", False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", "abc"', True),
+    ('"x",W/"abc"', True),
+    ('"x", "y"', False),
+    ("*", True),
+    (" * ", True),
+    ('"ab"', False),
+])
+def test_etag_matches(header, match):
+    assert app.etag_matches(header, '"abc"') is match
+
+
+def test_driver_etag_y_304(client, onedrive):
+    r = client.get("/driver", params={"doc": "2", "t": token("2")})
+    assert r.status_code == 200
+    assert r.json() == {"ok": True, "driver": app._record("2", SHEETS["MINA A"]["2"])}
+    etag = r.headers["ETag"]
+    assert r.headers["Cache-Control"] == f"private, max-age={app.DRIVER_MAX_AGE}"
+    assert "X-Data-Age" in r.headers and "Server-Timing" in r.headers
+
+    for inm in (etag, f"W/{etag}", f'"otro", {etag}', "*"):
+        r304 = client.get("/driver", params={"doc": "2", "t": token("2")}, headers={"If-None-Match": inm})
+        assert r304.status_code == 304
+        assert r304.content == b""
+        for h in ("ETag", "Cache-Control", "X-Data-Age", "Server-Timing"):
+            assert h in r304.headers
+        assert r304.headers["ETag"] == etag
+
+    r = client.get("/driver", params={"doc": "2", "t": token("2")}, headers={"If-None-Match": '"otro"'})
+    assert r.status_code == 200 and r.headers["ETag"] == etag
+    # todo salió del snapshot: una sola descarga
+    assert onedrive.downloads == 1
+
+
+def test_driver_etag_cambia_con_el_dato(client, onedrive):
+    etag = client.get("/driver", params={"doc": "3", "t": token("3")}).headers["ETag"]
+    onedrive.content = workbook({"MINA A": rows("1", "2"), "MINA B": rows("2", "3", tag=" nuevo")})
+    app._SNAPSHOT = None   # como si hubiera pasado el refresco
+    r = client.get("/driver", params={"doc": "3", "t": token("3")}, headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["ETag"] != etag
+    assert r.json()["driver"]["NOMBRES_Y_APELLIDOS"] == "NOMBRE 3 nuevo"
+
+
+def test_driver_token_invalido(client):
+    r = client.get("/driver", params={"doc": "2", "t": token("1")})
+    assert r.status_code == 401
+
+
+def test_batch(client, onedrive):
+    items = [
+        {"doc": "1", "t": token("1")},
+        {"doc": " 3 ", "t": token(" 3 ")},
+        {"doc": "2", "t": token("1")},
+        {"doc": "99", "t": token("99")},
+    ]
+    r = client.post("/driver/batch", json={"items": items})
+    assert r.status_code == 200
+    assert "X-Data-Age" in r.headers and "Server-Timing" in r.headers
+    assert r.json() == {"ok": True, "results": [
+        # en la primera hoja: se responde desde su índice (sin "sheet")
+        {"doc": "1", "status": "found", "driver": app._record("1", SHEETS["MINA A"]["1"])},
+        {"doc": " 3 ", "status": "found", "sheet": "MINA B", "driver": app._record("3", SHEETS["MINA B"]["3"])},
+        {"doc": "2", "status": "invalid_token"},
+        {"doc": "99", "status": "not_found"},
+    ]}
+    assert onedrive.downloads == 1
+
+
+def test_batch_igual_que_driver(client):
+    # cada item "found" lleva el mismo driver que /driver con la misma hoja
+    for sheet_name in ("MINA B", app.ALL_SHEETS):
+        docs = ["1", "2", "3"]
+        r = client.post("/driver/batch", json={
+            "items": [{"doc": d, "t": token(d)} for d in docs], "sheet_name": sheet_name, "header_row": H,
+        })
+        for d, res in zip(docs, r.json()["results"]):
+            one = client.get("/driver", params={"doc": d, "t": token(d), "sheet_name": sheet_name, "header_row": H})
+            if one.status_code == 404:
+                assert res == {"doc": d, "status": "not_found"}
+            else:
+                assert res["driver"] == one.json()["driver"]
+
+
+def test_batch_demasiados_items(client, monkeypatch):
+    monkeypatch.setattr(app, "BATCH_MAX_ITEMS", 2)
+    r = client.post("/driver/batch", json={"items": [{"doc": d, "t": token(d)} for d in "123"]})
+    assert r.status_code == 400
+
+
+def test_tokens_de_listado_sin_excel(client, onedrive, monkeypatch):
+    monkeypatch.delenv("ONEDRIVE_URL")
+    monkeypatch.setenv("ADMIN_TOKEN", "admin")
+    auth = {"Authorization": "Bearer admin"}
+    r = client.post("/admin/tokens", params={"format": "ndjson"}, headers=auth, files={"file": ("dnis.txt", b"DNI\n1\n2\n")})
+    assert r.status_code == 200
+    assert [line["token"] for line in map(orjson.loads, r.content.splitlines())] == [token("1"), token("2")]
+    assert onedrive.downloads == 0
+    # lo que sí lee el Excel sigue pidiendo la fuente
+    assert client.get("/admin/tokens", headers=auth).status_code == 500
+    assert client.get("/driver", params={"doc": "1", "t": token("1")}).status_code == 500
+
+
+def test_excel_sin_encabezados_no_se_vuelve_a_parsear(client, onedrive, monkeypatch):
+    wb = Workbook()
+    wb.active.append(["SIN", "ENCABEZADOS"])
+    out = io.BytesIO()
+    wb.save(out)
+    onedrive.content = out.getvalue()
+    builds = []
+    real = app.build_driver_index
+    monkeypatch.setattr(app, "build_driver_index", lambda *a, **kw: builds.append(a[1:3]) or real(*a, **kw))
+
+    for _ in range(5):
+        r = client.get("/driver", params={"doc": "1", "t": token("1")})
+        assert r.status_code == 400
+    assert builds == [(app.ALL_SHEETS, app.DEFAULT_HEADER_ROW)]
+    # otra pista es otra clave: un parseo más, y después también queda guardado
+    for _ in range(2):
+        assert client.get("/driver", params={"doc": "1", "t": token("1"), "header_row": 3}).status_code == 400
+    assert len(builds) == 2
+
+    # con otra versión del Excel el error se olvida
+    onedrive.content = workbook(SHEETS)
+    app._SNAPSHOT = None
+    assert client.get("/driver", params={"doc": "1", "t": token("1")}).status_code == 200
+    assert not any(k[0] != app._SNAPSHOT.workbook.version for k in app._INDEX_ERRORS)
+
+
+def test_hoja_inexistente(client, onedrive, monkeypatch):
+    assert client.get("/driver", params={"doc": "1", "t": token("1")}).status_code == 200
+    builds = []
+    real = app.build_driver_index
+    monkeypatch.setattr(app, "build_driver_index", lambda *a, **kw: builds.append(a[1:3]) or real(*a, **kw))
+
+    for _ in range(3):
+        r = client.get("/driver", params={"doc": "1", "t": token("1"), "sheet_name": "NOPE"})
+        assert r.status_code == 400
+        assert r.json()["detail"]["hojas"] == ["MINA A", "MINA B"]
+    # las hojas de esta versión ya se conocían del refresco: no se abre el Excel
+    assert builds == []
+    assert client.get("/driver", params={"doc": "3", "t": token("3"), "sheet_name": "MINA B"}).status_code == 200
+
+
+@pytest.mark.parametrize("index_sheets", [["MINA B"], ["NOPE"]])
+def test_index_sheets_no_cambia_la_busqueda_sin_hoja(client, monkeypatch, index_sheets):
+    monkeypatch.setattr(app, "INDEX_SHEETS", index_sheets)
+    # "1" solo está en la primera hoja, que no está en INDEX_SHEETS
+    r = client.get("/driver", params={"doc": "1", "t": token("1")})
+    assert r.status_code == 200
+    assert r.json()["driver"] == app._record("1", SHEETS["MINA A"]["1"])
+    r = client.get("/driver", params={"doc": "1", "t": token("1"), "sheet_name": app.ALL_SHEETS})
+    assert r.status_code == (404 if index_sheets == ["MINA B"] else 400)
+    if index_sheets == ["MINA B"]:
+        r = client.get("/driver", params={"doc": "3", "t": token("3")})
+        assert r.status_code == 200 and r.headers["X-Driver-Sheet"] == "MINA%20B"
+
+
+def test_fuentes_con_la_misma_url_descargan_una_vez(client, onedrive, monkeypatch):
+    monkeypatch.setenv("ONEDRIVE_SOURCES", orjson.dumps([
+        {"name": "a", "url": URL, "sheet_name": "MINA A"},
+        {"name": "b", "url": URL, "sheet_name": "MINA B"},
+    ]).decode())
+    r = client.get("/driver", params={"doc": "3", "t": token("3")})
+    assert r.status_code == 200 and r.headers["X-Driver-Source"] == "b"
+    assert onedrive.downloads == 1
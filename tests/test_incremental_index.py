@@ -0,0 +1,141 @@
+"""
+El camino incremental de DriverIndex (from_rows con `base`, merge con `prev`)
+debe dar exactamente el mismo índice que armarlo desde cero.
+"""
+import io
+
+import pytest
+from openpyxl import Workbook
+
+import app
+import bench
+
+H = bench.HEADER_ROW
+
+
+def assert_same(inc: app.DriverIndex, full: app.DriverIndex):
+    assert dict(inc) == dict(full)
+    assert inc.bodies == full.bodies
+    assert inc.etags == full.etags
+    assert inc.row_hashes == full.row_hashes
+    assert inc.header_row == full.header_row
+    assert inc.kind == full.kind
+    assert inc.origin == full.origin
+    assert inc.first_sheet == full.first_sheet
+    assert list(inc.parts) == list(full.parts)
+    for name, part in inc.parts.items():
+        assert_same(part, full.parts[name])
+    assert (inc.first is None) == (full.first is None)
+    if full.first is not None:
+        assert_same(inc.first, full.first)
+    if full.origin is not None:
+        assert {d: inc.where(d) for d in full} == {d: full.where(d) for d in full}
+
+
+def rows(*dnis, tag=""):
+    return {d: (f"NOMBRE {d}{tag}", "2025-01-01", "HABILITADO") for d in dnis}
+
+
+OLD = rows("1", "2", "3", "4")
+CHANGES = {
+    "sin cambios": dict(OLD),
+    "agregadas": {**OLD, **rows("5", "6")},
+    "quitadas": {d: OLD[d] for d in ("1", "3")},
+    "cambiadas": {**OLD, **rows("2", tag=" (nuevo)")},
+    "todo junto": {**{d: OLD[d] for d in ("1", "4")}, **rows("2", tag=" (nuevo)"), **rows("7")},
+    "vacía": {},
+}
+
+
+@pytest.mark.parametrize("new", CHANGES.values(), ids=CHANGES.keys())
+@pytest.mark.parametrize("header_row", [H, H + 1])
+def test_from_rows(new, header_row):
+    base = app.DriverIndex.from_rows(OLD, H)
+    inc = app.DriverIndex.from_rows(new, header_row, base)
+    assert_same(inc, app.DriverIndex.from_rows(new, header_row))
+    assert (inc is base) == (new == OLD and header_row == H)
+
+
+def workbook(sheets: dict) -> bytes:
+    """Un Excel con {título -> {DNI -> campos}}; cada hoja con la tabla en la fila H."""
+    wb = Workbook()
+    wb.remove(wb.active)
+    for title, data in sheets.items():
+        ws = wb.create_sheet(title)
+        for _ in range(H - 1):
+            ws.append([])
+        ws.append([bench.REQUIRED_AT.get(c, "") for c in range(1, 34)])
+        for dni, (name, fvig, stat) in data.items():
+            ws.append(["", "", "", name, dni] + [""] * 26 + [fvig, stat])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+# "3" está en las dos hojas: gana la primera mientras siga ahí
+SHEETS_OLD = {"MINA A": rows("1", "2", "3"), "MINA B": rows("3", "4", "5", tag=" B")}
+SHEETS_CHANGES = {
+    "sin cambios": SHEETS_OLD,
+    "agregadas": {"MINA A": rows("1", "2", "3", "8"), "MINA B": rows("3", "4", "5", "9", tag=" B")},
+    "quitada la repetida": {"MINA A": rows("1", "2"), "MINA B": SHEETS_OLD["MINA B"]},
+    "cambiada una hoja": {"MINA A": SHEETS_OLD["MINA A"], "MINA B": rows("3", "4", "5", tag=" B2")},
+    "todo junto": {"MINA A": rows("2", "6", tag=" x"), "MINA B": rows("3", "5", "7", tag=" B")},
+}
+
+
+@pytest.mark.parametrize("fast", [True, False], ids=["xlsx_stream", "openpyxl"])
+@pytest.mark.parametrize("new", SHEETS_CHANGES.values(), ids=SHEETS_CHANGES.keys())
+@pytest.mark.parametrize("sheet_name", [app.ALL_SHEETS, "MINA B"])
+@pytest.mark.parametrize("index_sheets", [[], ["MINA B"]], ids=["todas", "INDEX_SHEETS"])
+def test_build_driver_index(monkeypatch, fast, new, sheet_name, index_sheets):
+    monkeypatch.setattr(app, "XLSX_FAST_READER", fast)
+    monkeypatch.setattr(app, "INDEX_SHEETS", index_sheets)
+    base = app.build_driver_index(workbook(SHEETS_OLD), sheet_name, H)
+    inc = app.build_driver_index(workbook(new), sheet_name, H, base=base)
+    assert_same(inc, app.build_driver_index(workbook(new), sheet_name, H))
+
+
+@pytest.mark.parametrize("fast", [True, False], ids=["xlsx_stream", "openpyxl"])
+def test_hoja_inexistente(monkeypatch, fast):
+    monkeypatch.setattr(app, "XLSX_FAST_READER", fast)
+    with pytest.raises(app.HTTPException) as e:
+        app.build_driver_index(workbook(SHEETS_OLD), "NOPE", H)
+    assert e.value.status_code == 400 and e.value.detail["hojas"] == ["MINA A", "MINA B"]
+
+
+def sources(version: dict) -> dict:
+    """{fuente -> índice}: cada fuente es una hoja suelta o un merge de hojas."""
+    return {
+        name: app.DriverIndex.merge({t: app.DriverIndex.from_rows(r, H) for t, r in data.items()}, H)
+        if isinstance(data, dict) and all(isinstance(v, dict) for v in data.values())
+        else app.DriverIndex.from_rows(data, H)
+        for name, data in version.items()
+    }
+
+
+SOURCES_OLD = {"norte": SHEETS_OLD, "sur": rows("4", "10", "11", tag=" sur")}
+SOURCES_CHANGES = {
+    "agregadas": {"norte": SHEETS_OLD, "sur": rows("4", "10", "11", "12", tag=" sur")},
+    "quitada la que tapaba": {"norte": {"MINA A": rows("1"), "MINA B": rows("3", "5")}, "sur": SOURCES_OLD["sur"]},
+    "cambiadas": {"norte": SHEETS_CHANGES["cambiada una hoja"], "sur": rows("4", "10", "11", tag=" sur2")},
+    "todo junto": {"norte": SHEETS_CHANGES["todo junto"], "sur": rows("1", "4", "13", tag=" sur")},
+}
+
+
+@pytest.mark.parametrize("new", SOURCES_CHANGES.values(), ids=SOURCES_CHANGES.keys())
+def test_merge_sources(new):
+    old_parts = sources(SOURCES_OLD)
+    prev = app.DriverIndex.merge(old_parts, app.DEFAULT_HEADER_ROW, kind="source")
+    # como en el refresco: las fuentes sin cambios conservan el mismo objeto
+    parts = {
+        name: old_parts[name] if new[name] is SOURCES_OLD[name] else part
+        for name, part in sources(new).items()
+    }
+    inc = app.DriverIndex.merge(parts, app.DEFAULT_HEADER_ROW, kind="source", prev=prev)
+    assert_same(inc, app.DriverIndex.merge(parts, app.DEFAULT_HEADER_ROW, kind="source"))
+
+
+def test_merge_sin_cambios_devuelve_prev():
+    parts = sources(SOURCES_OLD)
+    prev = app.DriverIndex.merge(parts, app.DEFAULT_HEADER_ROW, kind="source")
+    assert app.DriverIndex.merge(dict(parts), app.DEFAULT_HEADER_ROW, kind="source", prev=prev) is prev
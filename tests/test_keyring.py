@@ -0,0 +1,73 @@
+"""
+Keyring / parse_keyring: tokens con prefijo de clave, tokens viejos sin
+prefijo y SECRET_KEYS mal escrito.
+"""
+import pytest
+
+import app
+
+
+def test_firma_con_la_primera_y_verifica_todas():
+    ring = app.parse_keyring("k2:secreto2, k1:secreto1")
+    assert ring.active_kid == "k2" and ring.kids == ["k2", "k1"]
+    t = ring.sign("123")
+    assert t == "k2." + app.sign("123", "secreto2")
+    assert ring.verify("123", t)
+    # un QR impreso con la clave anterior sigue valiendo
+    assert ring.verify("123", "k1." + app.sign("123", "secreto1"))
+
+
+def test_kid_se_verifica_solo_contra_su_clave():
+    ring = app.parse_keyring("k2:secreto2,k1:secreto1")
+    assert not ring.verify("123", "k1." + app.sign("123", "secreto2"))
+    assert not ring.verify("123", "k2." + app.sign("124", "secreto2"))
+
+
+@pytest.mark.parametrize("t", ["k9.x", "k3.", ".", "k2.", "", "k2..x"])
+def test_token_invalido(t):
+    ring = app.parse_keyring("k2:secreto2,k1:secreto1")
+    assert not ring.verify("123", t)
+
+
+def test_kid_desconocido():
+    ring = app.parse_keyring("k2:secreto2")
+    assert not ring.verify("123", "k1." + app.sign("123", "secreto2"))
+
+
+def test_token_viejo_sin_prefijo():
+    ring = app.parse_keyring("k2:secreto2,k1:secreto1")
+    assert ring.verify("123", app.sign("123", "secreto1"))
+    assert ring.verify("123", app.sign("123", "secreto2"))
+    assert not ring.verify("123", app.sign("123", "otro"))
+    assert not ring.verify("124", app.sign("123", "secreto1"))
+
+
+def test_solo_secret_key():
+    ring = app.parse_keyring("", "secreto")
+    assert ring.active_kid is None and ring.kids == [None]
+    t = ring.sign("123")
+    assert t == app.sign("123", "secreto") and "." not in t
+    assert ring.verify("123", t)
+    assert not ring.verify("123", "k1." + t)
+
+
+def test_secret_key_con_secret_keys():
+    ring = app.parse_keyring("k2:secreto2", "legado")
+    assert ring.active_kid == "k2" and ring.kids == ["k2", None]
+    assert ring.sign("123").startswith("k2.")
+    # SECRET_KEY solo verifica los tokens sin prefijo
+    assert ring.verify("123", app.sign("123", "legado"))
+    assert not ring.verify("123", "k2." + app.sign("123", "legado"))
+
+
+def test_sin_claves():
+    assert app.parse_keyring("", "") is None
+    assert app.parse_keyring(" , ,") is None
+    with pytest.raises(ValueError):
+        app.Keyring([])
+
+
+@pytest.mark.parametrize("raw", ["k1", "k1:", ":secreto", " :secreto", "k.1:secreto", "k2:s2,k1", "k1:a,k1:b", "k1:a, k2:b , k1:a"])
+def test_secret_keys_mal_escrito(raw):
+    with pytest.raises(ValueError, match="SECRET_KEYS"):
+        app.parse_keyring(raw, "legado")
@@ -0,0 +1,127 @@
+"""
+save_snapshot + load_snapshot deben devolver los mismos índices que había en
+memoria: los de la caché por (versión, hoja, fila) y el unificado de las fuentes.
+"""
+import hashlib, time
+
+import orjson
+import pytest
+
+import app
+from test_incremental_index import H, SHEETS_OLD, assert_same, rows, workbook
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "SNAPSHOT_PATH", str(tmp_path / "snapshot.json"))
+    monkeypatch.setattr(app, "_SNAPSHOT", None)
+    monkeypatch.setattr(app, "_INDEX_CACHE", {})
+    monkeypatch.setattr(app, "_INDEX_ERRORS", {})
+    monkeypatch.setattr(app, "_SHEET_TITLES", {})
+    monkeypatch.setattr(app, "_WORKBOOKS", {})
+    monkeypatch.delenv("ONEDRIVE_URL", raising=False)
+    monkeypatch.delenv("ONEDRIVE_SOURCES", raising=False)
+
+
+def workbook_file(url: str, content: bytes) -> app.WorkbookFile:
+    return app.WorkbookFile(
+        url=url, content=content, version=hashlib.sha256(content).hexdigest(),
+        etag='"v1"', last_modified=None, fetched_at=time.time(),
+    )
+
+
+def round_trip(snap: app.Snapshot) -> app.Snapshot:
+    """Guarda, vacía las cachés y vuelve a cargar; compara con lo que había."""
+    app._SNAPSHOT = snap
+    app.save_snapshot(snap)
+    before = dict(app._INDEX_CACHE)
+    app._INDEX_CACHE.clear()
+    app._WORKBOOKS.clear()
+    app._SNAPSHOT = None
+
+    loaded = app.load_snapshot()
+    assert loaded is not None and app._SNAPSHOT is loaded
+    assert loaded.sources == snap.sources
+    assert loaded.validated == snap.validated
+    assert loaded.workbooks == snap.workbooks
+    assert app._INDEX_CACHE.keys() == before.keys()
+    for key, index in before.items():
+        assert_same(app._INDEX_CACHE[key], index)
+    if snap.index is None:
+        assert loaded.index is None
+    else:
+        assert_same(loaded.index, snap.index)
+    return loaded
+
+
+def test_fuente_unica(monkeypatch):
+    url = "https://example.com/conductores.xlsx"
+    monkeypatch.setenv("ONEDRIVE_URL", url)
+    wbf = workbook_file(url, workbook(SHEETS_OLD))
+    app.get_driver_index(wbf.content, app.ALL_SHEETS, H, wbf.version)
+    app.get_driver_index(wbf.content, "MINA B", H + 3, wbf.version)   # pista equivocada
+    snap = app.Snapshot(sources=app.configured_sources(), workbooks={"default": wbf}, validated={"default": 1.0})
+
+    round_trip(snap)
+    # las hojas sueltas siguen siendo las mismas partes del combinado
+    star = app._INDEX_CACHE[(wbf.version, app.ALL_SHEETS, H)]
+    assert app._INDEX_CACHE[(wbf.version, "MINA B", H + 3)] is star.parts["MINA B"]
+    assert app._INDEX_CACHE[(wbf.version, None, H)] is star.parts["MINA A"]
+
+
+def test_varias_fuentes(monkeypatch):
+    monkeypatch.setenv("ONEDRIVE_SOURCES", orjson.dumps([
+        {"name": "norte", "url": "https://example.com/norte.xlsx"},
+        {"name": "sur", "url": "https://example.com/sur.xlsx", "sheet_name": "SUR", "header_row": H},
+    ]).decode())
+    sources = app.configured_sources()
+    wbfs = {
+        "norte": workbook_file(sources[0].url, workbook(SHEETS_OLD)),
+        "sur": workbook_file(sources[1].url, workbook({"SUR": rows("4", "10", tag=" sur")})),
+    }
+    parts = {
+        src.name: app.get_driver_index(wbfs[src.name].content, src.sheet_name, src.header_row, wbfs[src.name].version)
+        for src in sources
+    }
+    index = app.DriverIndex.merge(parts, app.DEFAULT_HEADER_ROW, kind="source")
+    snap = app.Snapshot(sources=sources, workbooks=wbfs, validated={"norte": 1.0, "sur": 2.0}, index=index)
+
+    loaded = round_trip(snap)
+    assert loaded.index.where("3") == {"source": "norte", "sheet": "MINA A"}
+    assert loaded.index.parts["sur"] is app._INDEX_CACHE[(wbfs["sur"].version, "SUR", H)]
+
+
+def test_formato_distinto_se_ignora(monkeypatch):
+    url = "https://example.com/conductores.xlsx"
+    monkeypatch.setenv("ONEDRIVE_URL", url)
+    wbf = workbook_file(url, workbook(SHEETS_OLD))
+    snap = app.Snapshot(sources=app.configured_sources(), workbooks={"default": wbf}, validated={"default": 1.0})
+    app.save_snapshot(snap)
+    monkeypatch.setattr(app, "SNAPSHOT_FORMAT", app.SNAPSHOT_FORMAT + 1)
+    assert app.load_snapshot() is None
+
+
+@pytest.mark.parametrize("setting, value", [("INDEX_SHEETS", ["MINA A"]), ("HEADER_SCAN_ROWS", 5)])
+def test_otros_ajustes_de_indexado_se_ignora(monkeypatch, setting, value):
+    url = "https://example.com/conductores.xlsx"
+    monkeypatch.setenv("ONEDRIVE_URL", url)
+    wbf = workbook_file(url, workbook(SHEETS_OLD))
+    app.get_driver_index(wbf.content, app.ALL_SHEETS, H, wbf.version)
+    snap = app.Snapshot(sources=app.configured_sources(), workbooks={"default": wbf}, validated={"default": 1.0})
+    app.save_snapshot(snap)
+    # el Excel no cambió (OneDrive contestaría 304), pero "*" ya no tendría las mismas hojas
+    monkeypatch.setattr(app, setting, value)
+    assert app.load_snapshot() is None
+
+
+def test_index_sheets_y_primera_hoja(monkeypatch):
+    url = "https://example.com/conductores.xlsx"
+    monkeypatch.setenv("ONEDRIVE_URL", url)
+    monkeypatch.setattr(app, "INDEX_SHEETS", ["MINA B"])
+    wbf = workbook_file(url, workbook(SHEETS_OLD))
+    star = app.get_driver_index(wbf.content, app.ALL_SHEETS, H, wbf.version)
+    assert list(star.parts) == ["MINA B"] and star.first_sheet == "MINA A"
+    snap = app.Snapshot(sources=app.configured_sources(), workbooks={"default": wbf}, validated={"default": 1.0})
+
+    round_trip(snap)
+    assert app._INDEX_CACHE[(wbf.version, None, H)] is app._INDEX_CACHE[(wbf.version, app.ALL_SHEETS, H)].first
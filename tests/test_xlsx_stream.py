@@ -0,0 +1,178 @@
+"""
+xlsx_stream.XlsxReader debe dar exactamente lo mismo que openpyxl con
+read_only=True, data_only=True y values_only=True.
+"""
+import io, zipfile
+
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.chart import BarChart, Reference
+
+import bench
+import xlsx_stream
+
+NS = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+# estilos: 0 = general, 1 = fecha integrada (14), 2 = fecha y hora propia, 3 = número con decimales
+STYLES = f"""<styleSheet {NS}>
+<numFmts count="1"><numFmt numFmtId="164" formatCode="dd/mm/yyyy hh:mm"/></numFmts>
+<fonts count="1"><font><sz val="11"/></font></fonts><fills count="1"><fill><patternFill patternType="none"/></fill></fills>
+<borders count="1"><border/></borders>
+<cellStyleXfs count="1"><xf/></cellStyleXfs>
+<cellXfs count="4"><xf numFmtId="0"/><xf numFmtId="14"/><xf numFmtId="164"/><xf numFmtId="4"/></cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+SHARED = [
+    "<t>HOLA</t>",
+    '<t xml:space="preserve">  con espacios  </t>',
+    "<r><t>RICO </t></r><r><rPr><b/></rPr><t>TEXTO</t></r>",
+    "<t>ÁÉÍ Ñ &amp; &lt;x&gt;</t>",
+    "<t>_x005F_x0041_</t>",
+]
+
+
+def make_xlsx(sheet_data: str, dimension: str = None, date1904: bool = False) -> bytes:
+    """Paquete mínimo a mano, para controlar cada detalle del XML de la hoja."""
+    dim = f'<dimension ref="{dimension}"/>' if dimension else ""
+    sst = "".join(f"<si>{s}</si>" for s in SHARED)
+    parts = {
+        "[Content_Types].xml": (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+            "</Types>"
+        ),
+        "_rels/.rels": (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'<Relationship Id="rId1" Type="{REL}/officeDocument" Target="xl/workbook.xml"/>'
+            "</Relationships>"
+        ),
+        "xl/workbook.xml": (
+            f'<workbook {NS} xmlns:r="{REL}">'
+            + ('<workbookPr date1904="1"/>' if date1904 else "<workbookPr/>")
+            + '<sheets><sheet name="HOJA" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'<Relationship Id="rId1" Type="{REL}/worksheet" Target="worksheets/sheet1.xml"/>'
+            f'<Relationship Id="rId2" Type="{REL}/styles" Target="styles.xml"/>'
+            f'<Relationship Id="rId3" Type="{REL}/sharedStrings" Target="sharedStrings.xml"/>'
+            "</Relationships>"
+        ),
+        "xl/styles.xml": STYLES,
+        "xl/sharedStrings.xml": f'<sst {NS} count="{len(SHARED)}" uniqueCount="{len(SHARED)}">{sst}</sst>',
+        "xl/worksheets/sheet1.xml": f"<worksheet {NS}>{dim}<sheetData>{sheet_data}</sheetData></worksheet>",
+    }
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as zf:
+        for name, xml in parts.items():
+            zf.writestr(name, xml)
+    return out.getvalue()
+
+
+def both(data: bytes, sheet=None, **kw):
+    """(filas de xlsx_stream, filas de openpyxl) con los mismos argumentos."""
+    fast = xlsx_stream.XlsxReader(data)
+    ref = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        ws_fast = fast[sheet] if sheet else fast.worksheets[0]
+        ws_ref = ref[sheet] if sheet else ref.worksheets[0]
+        return list(ws_fast.iter_rows(values_only=True, **kw)), list(ws_ref.iter_rows(values_only=True, **kw))
+    finally:
+        fast.close()
+        ref.close()
+
+
+CELLS = (
+    # textos: compartidos (con runs, espacios, escapes) e inline
+    '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c><c r="C1" t="s"><v>2</v></c>'
+    '<c r="D1" t="s"><v>3</v></c><c r="E1" t="s"><v>4</v></c></row>'
+    '<row r="2"><c r="A2" t="inlineStr"><is><t>INLINE</t></is></c>'
+    '<c r="B2" t="inlineStr"><is><r><t>IN</t></r><r><t>LINE RICO</t></r></is></c><c r="C2" t="inlineStr"/></row>'
+    # números, fechas y booleanos
+    '<row r="3"><c r="A3"><v>42</v></c><c r="B3"><v>1.5</v></c><c r="C3"><v>1E3</v></c>'
+    '<c r="D3" s="1"><v>45000</v></c><c r="E3" s="2"><v>45000.75</v></c><c r="F3" s="3"><v>7</v></c>'
+    '<c r="G3" t="b"><v>1</v></c><c r="H3" t="b"><v>0</v></c><c r="I3" t="d"><v>2024-02-29T10:30:00</v></c></row>'
+    # fórmulas: se lee el valor cacheado (o None si no hay)
+    '<row r="4"><c r="A4"><f>1+1</f><v>2</v></c><c r="B4" t="str"><f>"a"&amp;"b"</f><v>ab</v></c>'
+    '<c r="C4" t="e"><f>1/0</f><v>#DIV/0!</v></c><c r="D4" t="b"><f>TRUE()</f><v>1</v></c>'
+    '<c r="E4"><f>A4*2</f></c><c r="F4" s="1"><f>TODAY()</f><v>45001</v></c></row>'
+    # fila vacía, fila salteada y celdas sin valor
+    '<row r="5"/><row r="7"><c r="B7"/><c r="D7"><v>3</v></c></row>'
+)
+
+
+@pytest.mark.parametrize("date1904", [False, True])
+@pytest.mark.parametrize("dimension", [None, "A1:I7"])
+def test_tipos_de_celda(date1904, dimension):
+    fast, ref = both(make_xlsx(CELLS, dimension, date1904))
+    assert fast == ref
+
+
+def test_sin_atributo_r():
+    # filas y celdas sin "r": la posición sale del orden en el XML
+    rows = (
+        '<row><c t="s"><v>0</v></c><c><v>1</v></c><c r="E1"><v>5</v></c><c><v>6</v></c></row>'
+        '<row><c><v>2</v></c></row>'
+        '<row r="5"><c r="C5"><v>3</v></c></row>'
+        '<row><c><v>4</v></c><c t="b"><v>1</v></c></row>'
+    )
+    for dimension in (None, "A1:F6"):
+        fast, ref = both(make_xlsx(rows, dimension))
+        assert fast == ref
+        assert fast[0][:2] == ("HOLA", 1) and fast[0][4:6] == (5, 6)
+        assert fast[5][:2] == (4, True)   # la fila sin "r" después de la 5 es la 6
+
+
+@pytest.mark.parametrize("dimension", [None, "A1:I7"])
+@pytest.mark.parametrize("kw", [
+    {},
+    {"min_row": 2},
+    {"max_row": 3},
+    {"max_row": 10},
+    {"min_row": 3, "max_row": 4},
+    {"min_row": 6, "max_row": 6},
+    {"min_col": 2},
+    {"max_col": 3},
+    {"min_col": 2, "max_col": 4},
+    {"min_col": 4, "max_col": 12},
+    {"min_row": 3, "max_row": 8, "min_col": 3, "max_col": 6},
+])
+def test_recortes(kw, dimension):
+    fast, ref = both(make_xlsx(CELLS, dimension), **kw)
+    assert fast == ref
+
+
+def test_workbook_de_openpyxl():
+    # lo que escribe openpyxl: sharedStrings, <dimension>, fechas con estilo, DNIs número y texto
+    data = bench.make_workbook(300)
+    for kw in ({}, {"min_row": bench.HEADER_ROW + 1, "min_col": 4, "max_col": 33}, {"max_row": 20, "max_col": 5}):
+        fast, ref = both(data, "CONDUCTORES", **kw)
+        assert fast == ref
+
+
+def test_chartsheet_primero():
+    # una pestaña de gráfico antes de los datos: worksheets[0] es la primera hoja de celdas
+    wb = Workbook()
+    wb.active.title = "DATA"
+    wb.active.append(["A", 1])
+    chart = BarChart()
+    chart.add_data(Reference(wb.active, min_col=2, min_row=1, max_row=1))
+    wb.create_chartsheet("CHART", 0).add_chart(chart)
+    out = io.BytesIO()
+    wb.save(out)
+    data = out.getvalue()
+    fast = xlsx_stream.XlsxReader(data)
+    ref = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        assert [ws.title for ws in fast.worksheets] == [ws.title for ws in ref.worksheets] == ["DATA"]
+    finally:
+        fast.close()
+        ref.close()
+    assert both(data) == ([("A", 1)], [("A", 1)])
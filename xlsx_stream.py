@@ -0,0 +1,324 @@
+"""
+Lector XLSX por streaming (solo lectura, solo valores).
+
+Alternativa rápida a `openpyxl.load_workbook(read_only=True)` para cuando solo
+interesan unas pocas columnas: abre el zip, recorre el XML de la hoja con
+iterparse y solo convierte las celdas del rango pedido, sin crear objetos
+Cell. `sharedStrings.xml` y `styles.xml` se leen recién cuando hacen falta.
+
+Los valores son los mismos que daría openpyxl con `data_only=True` y
+`values_only=True` (se reutilizan sus helpers de fechas y formatos). Ante
+cualquier cosa que no sepa leer lanza `UnsupportedWorkbook`, y quien llama
+debe volver a openpyxl.
+"""
+import io, posixpath, zipfile
+import xml.etree.ElementTree as ET
+from typing import Optional
+
+from openpyxl.styles.numbers import builtin_format_code, is_date_format
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, WINDOWS_EPOCH, from_excel, from_ISO8601
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_ROW = f"{{{NS_MAIN}}}row"
+_CELL = f"{{{NS_MAIN}}}c"
+_VALUE = f"{{{NS_MAIN}}}v"
+_INLINE = f"{{{NS_MAIN}}}is"
+_TEXT = f"{{{NS_MAIN}}}t"
+_RUN = f"{{{NS_MAIN}}}r"
+_SI = f"{{{NS_MAIN}}}si"
+_DIMENSION = f"{{{NS_MAIN}}}dimension"
+_SHEET_DATA = f"{{{NS_MAIN}}}sheetData"
+
+
+class UnsupportedWorkbook(Exception):
+    """El archivo no se puede leer por el camino rápido; usar openpyxl."""
+
+
+def _text_content(node) -> str:
+    # igual que openpyxl Text.content: <t> directo + <r><t> (se ignora <rPh>)
+    parts = []
+    for child in node:
+        if child.tag == _TEXT:
+            parts.append(child.text or "")
+        elif child.tag == _RUN:
+            t = child.find(_TEXT)
+            if t is not None and t.text is not None:
+                parts.append(t.text)
+    return "".join(parts)
+
+
+def _cast_number(value: str):
+    # igual que openpyxl: "1" -> int, "1.5" / "1E3" -> float
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+_COLUMNS: dict = {}
+
+def _column_index(ref: str) -> int:
+    """'AF12' -> 32"""
+    letters = ref.rstrip("0123456789")
+    col = _COLUMNS.get(letters)
+    if col is None:
+        col = 0
+        for ch in letters:
+            if not "A" <= ch <= "Z":
+                raise UnsupportedWorkbook(f"referencia de celda inválida: {ref!r}")
+            col = col * 26 + ord(ch) - 64
+        _COLUMNS[letters] = col
+    return col
+
+
+class XlsxReader:
+    """Workbook abierto desde bytes; `reader[nombre]` / `reader.worksheets[0]`."""
+
+    def __init__(self, data: bytes):
+        try:
+            self._zip = zipfile.ZipFile(io.BytesIO(data))
+        except zipfile.BadZipFile as e:
+            raise UnsupportedWorkbook(f"no es un zip: {e}")
+        self._shared_strings: Optional[list] = None
+        self._date_styles: Optional[set] = None
+
+        wb_path = self._main_part()
+        wb_root = self._parse(wb_path)
+        if wb_root.tag != f"{{{NS_MAIN}}}workbook":
+            raise UnsupportedWorkbook(f"workbook con namespace no soportado: {wb_root.tag}")
+
+        pr = wb_root.find(f"{{{NS_MAIN}}}workbookPr")
+        date1904 = pr is not None and pr.get("date1904", "").lower() in ("1", "true")
+        self.epoch = CALENDAR_MAC_1904 if date1904 else WINDOWS_EPOCH
+
+        rels = self._rels(wb_path)
+        self._strings_path = self._styles_path = None
+        for rtype, target in rels.values():
+            if rtype.endswith("/sharedStrings"):
+                self._strings_path = target
+            elif rtype.endswith("/styles"):
+                self._styles_path = target
+
+        self._sheets = {}
+        for sheet in wb_root.iterfind(f"{{{NS_MAIN}}}sheets/{{{NS_MAIN}}}sheet"):
+            rel = rels.get(sheet.get(f"{{{NS_REL}}}id"))
+            if rel is None:
+                raise UnsupportedWorkbook(f"hoja sin relación: {sheet.get('name')!r}")
+            # como wb.worksheets de openpyxl: sin chartsheets ni dialogsheets
+            if rel[0].endswith("/worksheet"):
+                self._sheets[sheet.get("name")] = rel[1]
+
+    # --- partes del paquete ---
+
+    def _parse(self, path: str):
+        try:
+            with self._zip.open(path) as f:
+                return ET.parse(f).getroot()
+        except KeyError:
+            raise UnsupportedWorkbook(f"falta {path}")
+        except ET.ParseError as e:
+            raise UnsupportedWorkbook(f"XML inválido en {path}: {e}")
+
+    def _main_part(self) -> str:
+        try:
+            rels = self._parse("_rels/.rels")
+        except UnsupportedWorkbook:
+            return "xl/workbook.xml"
+        for rel in rels.iterfind(f"{{{NS_PKG_REL}}}Relationship"):
+            if rel.get("Type", "").endswith("/officeDocument"):
+                return rel.get("Target", "").lstrip("/")
+        return "xl/workbook.xml"
+
+    def _rels(self, part: str) -> dict:
+        """{rId -> (tipo, ruta dentro del zip)} de una parte."""
+        folder, name = posixpath.split(part)
+        root = self._parse(posixpath.join(folder, "_rels", name + ".rels"))
+        rels = {}
+        for rel in root.iterfind(f"{{{NS_PKG_REL}}}Relationship"):
+            target = rel.get("Target", "")
+            if rel.get("TargetMode") == "External":
+                continue
+            if target.startswith("/"):
+                path = target.lstrip("/")
+            else:
+                path = posixpath.normpath(posixpath.join(folder, target))
+            rels[rel.get("Id")] = (rel.get("Type", ""), path)
+        return rels
+
+    @property
+    def shared_strings(self) -> list:
+        if self._shared_strings is None:
+            strings = []
+            if self._strings_path is not None:
+                try:
+                    with self._zip.open(self._strings_path) as f:
+                        for _, node in ET.iterparse(f):
+                            if node.tag == _SI:
+                                strings.append(_text_content(node).replace("x005F_", ""))
+                                node.clear()
+                except (KeyError, ET.ParseError) as e:
+                    raise UnsupportedWorkbook(f"sharedStrings ilegible: {e!r}")
+            self._shared_strings = strings
+        return self._shared_strings
+
+    @property
+    def date_styles(self) -> set:
+        """Índices de cellXfs cuyo formato numérico es de fecha (como openpyxl)."""
+        if self._date_styles is None:
+            styles = set()
+            if self._styles_path is not None:
+                root = self._parse(self._styles_path)
+                custom = {
+                    int(n.get("numFmtId")): n.get("formatCode")
+                    for n in root.iterfind(f"{{{NS_MAIN}}}numFmts/{{{NS_MAIN}}}numFmt")
+                }
+                for idx, xf in enumerate(root.iterfind(f"{{{NS_MAIN}}}cellXfs/{{{NS_MAIN}}}xf")):
+                    fmt_id = int(xf.get("numFmtId", 0))
+                    fmt = custom[fmt_id] if fmt_id in custom else builtin_format_code(fmt_id)
+                    if is_date_format(fmt):
+                        styles.add(idx)
+            self._date_styles = styles
+        return self._date_styles
+
+    # --- hojas ---
+
+    @property
+    def sheetnames(self) -> list:
+        return list(self._sheets)
+
+    @property
+    def worksheets(self) -> list:
+        return [XlsxSheet(self, name, path) for name, path in self._sheets.items()]
+
+    def __getitem__(self, name: str) -> "XlsxSheet":
+        try:
+            return XlsxSheet(self, name, self._sheets[name])
+        except KeyError:
+            raise KeyError(f"Worksheet {name} does not exist.")
+
+    def close(self):
+        self._zip.close()
+
+
+class XlsxSheet:
+
+    def __init__(self, reader: XlsxReader, title: str, path: str):
+        self.parent = reader
+        self.title = title
+        self._path = path
+
+    def _cell_value(self, c):
+        t = c.get("t", "n")
+        if t == "inlineStr":
+            node = c.find(_INLINE)
+            return _text_content(node) if node is not None else None
+        value = c.findtext(_VALUE) or None
+        if value is None:
+            return None
+        if t == "n":
+            value = _cast_number(value)
+            style = c.get("s")
+            if style and int(style) in self.parent.date_styles:
+                try:
+                    return from_excel(value, self.parent.epoch)
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            return value
+        if t == "s":
+            return self.parent.shared_strings[int(value)]
+        if t in ("str", "e"):
+            return value
+        if t == "b":
+            return bool(int(value))
+        if t == "d":
+            return from_ISO8601(value)
+        raise UnsupportedWorkbook(f"tipo de celda no soportado: {t!r}")
+
+    def iter_rows(self, min_row=None, max_row=None, min_col=None, max_col=None, values_only=True):
+        """
+        Igual que `Worksheet.iter_rows(values_only=True)` de openpyxl en modo
+        read_only: filas faltantes salen vacías y los límites por defecto son
+        los del <dimension> de la hoja.
+        """
+        if not values_only:
+            raise UnsupportedWorkbook("solo se soporta values_only=True")
+        min_row = min_row or 1
+        min_col = min_col or 1
+        try:
+            f = self.parent._zip.open(self._path)
+        except KeyError:
+            raise UnsupportedWorkbook(f"falta {self._path}")
+        try:
+            yield from self._rows(f, min_row, max_row, min_col, max_col)
+        except ET.ParseError as e:
+            raise UnsupportedWorkbook(f"XML inválido en {self._path}: {e}")
+        finally:
+            f.close()
+
+    def _rows(self, f, min_row, max_row, min_col, max_col):
+        empty_row = []   # sin ancho conocido openpyxl da una lista vacía (no una tupla)
+        counter = min_row
+        idx = 0
+        row_counter = 0
+        sheet_data = None
+        for event, node in ET.iterparse(f, events=("start", "end")):
+            tag = node.tag
+            if event == "start":
+                if tag == _SHEET_DATA:
+                    sheet_data = node
+                continue
+            if tag == _DIMENSION:
+                # mismos límites por defecto que ReadOnlyWorksheet
+                _, _, dim_col, dim_row = range_boundaries(node.get("ref"))
+                max_col = max_col or dim_col
+                max_row = max_row or dim_row
+                continue
+            if tag != _ROW:
+                continue
+
+            r = node.get("r")
+            idx = row_counter = int(float(r)) if r else row_counter + 1
+            if max_row is not None and idx > max_row:
+                break
+            if max_col is not None:
+                empty_row = (None,) * (max_col + 1 - min_col)
+
+            for _ in range(counter, idx):
+                counter += 1
+                yield empty_row
+
+            if counter <= idx:
+                counter += 1
+                yield self._row_values(node, min_col, max_col)
+            # liberar lo ya leído (iterparse va armando el árbol completo)
+            if sheet_data is not None:
+                sheet_data.clear()
+            else:
+                node.clear()
+
+        if max_row is not None and max_row < idx:
+            if max_col is not None:
+                empty_row = (None,) * (max_col + 1 - min_col)
+            for _ in range(counter, max_row + 1):
+                yield empty_row
+
+    def _row_values(self, row, min_col, max_col):
+        cells = []
+        col = 0
+        for c in row:
+            if c.tag != _CELL:
+                continue
+            ref = c.get("r")
+            col = _column_index(ref) if ref else col + 1
+            cells.append((col, c))
+        if not cells and not max_col:
+            return ()
+        hi = max_col or cells[-1][0]
+        values = [None] * (hi + 1 - min_col)
+        for col, c in cells:
+            if min_col <= col <= hi:
+                values[col - min_col] = self._cell_value(c)
+        return tuple(values)